@@ -1,12 +1,65 @@
 import acdreader
 import acdagent
+import agentsnapshot
+import smdrcli
 import operator
 import sys
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
+
+snapshot_directory = None
+while '-s' in sys.argv:
+    argindex = sys.argv.index('-s')
+    try:
+        snapshot_directory = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -s requires a snapshot directory')
+        exit()
+    del sys.argv[argindex:argindex + 2]
+
+extra_targets = []
+while '-t' in sys.argv:
+    argindex = sys.argv.index('-t')
+    try:
+        extra_targets.append(datetime.strptime(sys.argv[argindex + 1],
+                                               '%Y-%m-%d %H:%M:%S'))
+    except (IndexError, ValueError):
+        print('Invalid target datetime. Correct format is "YYYY-MM-DD HH:MM:SS"')
+        exit()
+    del sys.argv[argindex:argindex + 2]
+
+interval = None
+while '-i' in sys.argv:
+    argindex = sys.argv.index('-i')
+    try:
+        interval = timedelta(minutes=int(sys.argv[argindex + 1]))
+    except (IndexError, ValueError):
+        print('Error: -i requires an interval in minutes')
+        exit()
+    del sys.argv[argindex:argindex + 2]
+
+until_time = None
+while '-u' in sys.argv:
+    argindex = sys.argv.index('-u')
+    try:
+        until_time = datetime.strptime(sys.argv[argindex + 1],
+                                       '%Y-%m-%d %H:%M:%S')
+    except (IndexError, ValueError):
+        print('Invalid until datetime. Correct format is "YYYY-MM-DD HH:MM:SS"')
+        exit()
+    del sys.argv[argindex:argindex + 2]
+
+persist_index = smdrcli.pop_flag('-P')
+jobs = smdrcli.pop_jobs()
+
+timeline_mode = False
+while '-l' in sys.argv:
+    timeline_mode = True
+    sys.argv.remove('-l')
 
 if len(sys.argv) < 4:
-    print('Usage: ' + sys.argv[0] +
+    print('Usage: ' + sys.argv[0] + ' [-s snapshot_directory] [-j jobs] [-P]'
+          ' [-t target_datetime ...] [-i minutes [-u until_datetime]] [-l]'
           ' start_date target_datetime acd_file_path [agent_id [...]]')
     exit()
 
@@ -17,23 +70,71 @@ else:
 
 date_match = re.match('([0-9]{4}-[0-9]{2}-[0-9]{2}) ' +
                       '[0-9]{2}:[0-9]{2}:[0-9]{2}', sys.argv[2])
-if date_match:
-    end_date = date_match.group(1)
-else:
+if not date_match:
     print('Invalid target datetime. Correct format is "YYYY-MM-DD HH:MM:SS"')
     exit()
 
+target_time = datetime.strptime(sys.argv[2], '%Y-%m-%d %H:%M:%S')
+
+targets = [target_time] + extra_targets
+if interval is not None:
+    if until_time is None:
+        until_time = datetime(target_time.year, target_time.month,
+                              target_time.day, 23, 59, 59)
+    interval_time = target_time + interval
+    while interval_time <= until_time:
+        targets.append(interval_time)
+        interval_time += interval
+targets = sorted(set(targets))
+target_time = targets[0]
+end_date = targets[-1].strftime('%Y-%m-%d')
+multi_target_mode = len(targets) > 1
+
+agents = {}
+login_intervals = {}
+group_intervals = {}
+start_date = sys.argv[1]
+
+snapshots = None
+if snapshot_directory is not None:
+    try:
+        snapshots = agentsnapshot.AgentSnapshots(snapshot_directory,
+                                                 sys.argv[3])
+    except OSError as e:
+        print('Error creating snapshot directory: ' + str(e))
+        exit()
+    try:
+        replay_start = datetime.strptime(start_date, '%Y-%m-%d')
+    except ValueError:
+        print('Error processing input: Invalid start date')
+        exit()
+    snapshot_date, snapshot_agents = snapshots.find(
+            replay_start - timedelta(days=1), target_time - timedelta(days=1),
+            replay_start)
+    if snapshot_date is not None:
+        print('Starting from snapshot taken at end of ' +
+              snapshot_date.strftime('%Y-%m-%d'))
+        for agent in snapshot_agents.values():
+            if agent_filter is None or agent.reporting in agent_filter:
+                agents[agent.reporting] = agent
+        start_date = (snapshot_date + timedelta(days=1)).strftime('%Y-%m-%d')
+        for agent in agents.values():
+            if agent.is_logged_in == True:
+                login_intervals[agent.reporting] = [[agent.extension,
+                                                     agent.last_login, None]]
+            for group, agent_group in agent.agent_groups.items():
+                if agent_group.is_logged_in == True:
+                    group_intervals[(agent.reporting, group)] = [
+                            [agent_group.last_login, None]]
+
 try:
-    reader = acdreader.ACDReader(sys.argv[3], sys.argv[1], end_date)
+    reader = acdreader.ACDReader(sys.argv[3], start_date, end_date,
+                                 persist_index=persist_index)
 except acdreader.InvalidInputException as e:
     print('Error processing input: ' + str(e))
     exit()
 
-target_time = datetime.strptime(sys.argv[2], '%Y-%m-%d %H:%M:%S')
-
-agents = {}
-
-def print_results():
+def print_results(target_time):
     logged_in_agents = []
     logged_out_agents = []
     for agent in agents.values():
@@ -49,7 +150,12 @@ def print_results():
     for agent in logged_in_agents:
         print('Agent: {}\tExtension: {}\tLast login: {}'
               .format(agent.reporting, agent.extension,
-              agent.last_login.strftime('%Y-%m-%d %H:%M:%S')))
+              agent.last_login.strftime('%Y-%m-%d %H:%M:%S')), end='')
+        if multi_target_mode:
+            print('\tGroups: {}'.format(','.join(sorted(
+                  group for group, agent_group in agent.agent_groups.items()
+                  if agent_group.is_logged_in == True))), end='')
+        print()
     print('Known logged out agents:')
     for agent in logged_out_agents:
         print('Agent: {}\tExtension: {}\tLast logout: {}'
@@ -57,6 +163,36 @@ def print_results():
               agent.last_logout.strftime('%Y-%m-%d %H:%M:%S')))
 
 
+def print_timeline():
+    for agent in sorted(login_intervals):
+        for extension, login, logout in login_intervals[agent]:
+            print('login\t{}\t{}\t{}\t{}'.format(agent, extension,
+                  format_time(login), format_time(logout)))
+    for agent, group in sorted(group_intervals):
+        for login, logout in group_intervals[(agent, group)]:
+            print('group\t{}\t{}\t{}\t{}'.format(agent, group,
+                  format_time(login), format_time(logout)))
+
+
+def format_time(time):
+    if time is None:
+        return ''
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def open_interval(intervals, current_time, *values):
+    if len(intervals) > 0 and intervals[-1][-1] is None:
+        intervals[-1][-1] = current_time
+    intervals.append(list(values) + [current_time, None])
+
+
+def close_interval(intervals, current_time, *values):
+    if len(intervals) > 0 and intervals[-1][-1] is None:
+        intervals[-1][-1] = current_time
+    else:
+        intervals.append(list(values) + [None, current_time])
+
+
 def process_agent_login(line, current_time):
     agent = line[16:22].strip()
     if agent_filter is not None and agent not in agent_filter:
@@ -68,6 +204,9 @@ def process_agent_login(line, current_time):
     if agent not in agents:
         agents[agent] = acdagent.ACDAgent(agent)
     agents[agent].login(extension, current_time)
+    if timeline_mode:
+        open_interval(login_intervals.setdefault(agent, []), current_time,
+                      extension)
 
 
 def process_agent_logout(line, current_time):
@@ -80,6 +219,9 @@ def process_agent_logout(line, current_time):
     if agent not in agents:
         agents[agent] = acdagent.ACDAgent(agent)
     agents[agent].logout(current_time)
+    if timeline_mode:
+        close_interval(login_intervals.setdefault(agent, []), current_time,
+                       extension)
 
 
 def process_group_event(line, current_time):
@@ -101,35 +243,50 @@ def process_group_event(line, current_time):
         print('Agent ' + agent + ' logged in to group ' + group +
               ' at ' + current_time.strftime('%H:%M:%S'))
         agents[agent].login_to_group(group, current_time)
+        if timeline_mode:
+            open_interval(group_intervals.setdefault((agent, group), []),
+                          current_time)
     elif line_parts[7] == '1008':
         print('Agent ' + agent + ' logged out of group ' + group +
               ' at ' + current_time.strftime('%H:%M:%S'))
         agents[agent].logout_from_group(group, current_time)
+        if timeline_mode:
+            close_interval(group_intervals.setdefault((agent, group), []),
+                           current_time)
     elif line_parts[7] == '1011':
         print('Agent ' + agent + ' logged out of all groups '
               ' at ' + current_time.strftime('%H:%M:%S'))
         agents[agent].logout_from_all_groups(current_time)
+        if timeline_mode:
+            for group in agents[agent].agent_groups:
+                intervals = group_intervals.get((agent, group), [])
+                if len(intervals) > 0 and intervals[-1][-1] is None:
+                    intervals[-1][-1] = current_time
 
 
 def process_files():
-    for file in reader.file_reader():
-        for bline in file:
-            line = bline.decode('utf-8-sig')
-            if line[2] in ('A', 'B', 'y'):
-                current_time = datetime.strptime(
-                        reader.current_date.strftime('%Y%m%d')
-                        + line[3:9], '%Y%m%d%H%M%S')
-                if current_time >= target_time:
+    for file in reader.merged_file_reader(jobs):
+        for line in file:
+            current_time = datetime.strptime(
+                    reader.current_date.strftime('%Y%m%d')
+                    + line[3:9], '%Y%m%d%H%M%S')
+            while current_time >= targets[0]:
+                print_results(targets.pop(0))
+                if len(targets) == 0:
                     return
-            else:
-                continue
             if line[2] == 'A':
                 process_agent_login(line, current_time)
             elif line[2] == 'B':
                 process_agent_logout(line, current_time)
             elif line[2] == 'y':
                 process_group_event(line, current_time)
+        if (snapshots is not None and agent_filter is None and
+                reader.current_date.date() < datetime.now().date()):
+            snapshots.save(reader.current_date, agents, replay_start)
 
 
 process_files()
-print_results()
+for target in targets:
+    print_results(target)
+if timeline_mode:
+    print_timeline()
@@ -1,8 +1,15 @@
-import zipfile, datetime
+import datetime
+import heapq
+import smdrreader
+from collections import deque
 from os import path
 
+RECORD_TYPES = ('A', 'B', 'y')
+
+
 class ACDReader(object):
-    def __init__(self, data_directory, start_date, end_date):
+    def __init__(self, data_directory, start_date, end_date,
+                 persist_index=False):
         if path.isdir(data_directory):
             self.data_directory = data_directory
         else:
@@ -19,28 +26,121 @@ class ACDReader(object):
             raise InvalidInputException('Invalid end date')
 
         self.current_date = self.start_date
+        self.persist_index = persist_index
+        self.directory_index = smdrreader.DirectoryIndex(self.data_directory,
+                                                         persist_index)
+        self.directory_indexes = {self.data_directory: self.directory_index}
+
+
+    def get_node_dirs(self):
+        node_dirs = smdrreader.get_node_dirs(self.data_directory)
+        if len(node_dirs) == 0:
+            return [self.data_directory]
+        return node_dirs
+
+
+    def get_directory_index(self, dir):
+        if dir not in self.directory_indexes:
+            self.directory_indexes[dir] = smdrreader.DirectoryIndex(
+                    dir, self.persist_index)
+        return self.directory_indexes[dir]
+
+
+    def get_day_files(self, node_dirs):
+        date = self.current_date
+        while date <= self.end_date:
+            yield date, [(dir, self.get_directory_index(dir).get_file('a', date))
+                         for dir in node_dirs]
+            date += datetime.timedelta(days=1)
+
+
+    def report_missing_files(self, date, files):
+        print('Analyzing file for {}'.format(date.strftime('%Y-%m-%d')))
+        basename = 'a{}'.format(date.strftime('%Y%m%d'))
+        for dir, filefullpath in files:
+            if filefullpath is None:
+                print('failed to locate file {}'.format(path.join(dir,
+                                                                  basename)))
+        if all(filefullpath is None for dir, filefullpath in files):
+            print('No records for {}'.format(date.strftime('%Y-%m-%d')))
+            return True
+        return False
+
+
+    def merged_file_reader(self, jobs=1):
+        node_dirs = self.get_node_dirs()
+        context = smdrreader.get_pool_context()
+        if jobs <= 1 or context is None:
+            for date, files in self.get_day_files(node_dirs):
+                self.current_date = date
+                if self.report_missing_files(date, files):
+                    continue
+                yield merge_records([read_records(filefullpath)
+                                     for dir, filefullpath in files
+                                     if filefullpath is not None])
+            self.current_date = self.end_date + datetime.timedelta(days=1)
+            return
+
+        with context.Pool(jobs) as pool:
+            pending = deque()
+            for day in self.get_day_files(node_dirs):
+                date, files = day
+                pending.append((date, files, [
+                        pool.apply_async(load_records, (filefullpath,))
+                        for dir, filefullpath in files
+                        if filefullpath is not None]))
+                if len(pending) > 1:
+                    yield from self.collect_day(pending.popleft())
+            while len(pending) > 0:
+                yield from self.collect_day(pending.popleft())
+        self.current_date = self.end_date + datetime.timedelta(days=1)
+
+
+    def collect_day(self, pending_day):
+        date, files, results = pending_day
+        self.current_date = date
+        if not self.report_missing_files(date, files):
+            yield merge_records([result.get() for result in results])
+
+
+def get_record_time(line):
+    return line[3:9]
+
+
+def read_records(filefullpath):
+    with smdrreader.open_file(filefullpath) as acd_file:
+        for bline in acd_file:
+            line = bline.decode('utf-8-sig')
+            if len(line) > 2 and line[2] in RECORD_TYPES:
+                yield line
+
 
+def load_records(filefullpath):
+    return list(read_records(filefullpath))
 
-    def file_reader(self):
-        while self.current_date <= self.end_date:
-            print('Analyzing file for {}'.format(self.current_date.strftime('%Y-%m-%d')))
 
-            basename = 'a{}'.format(self.current_date.strftime('%Y%m%d'))
-            filename = path.join(self.data_directory, basename)
+def merge_records(record_streams):
+    if len(record_streams) == 1:
+        return record_streams[0]
+    return heapq.merge(*record_streams, key=get_record_time)
 
-            if path.isfile('{}.zip'.format(filename)):
-                myzip = zipfile.ZipFile('{}.zip'.format(filename))
-                with myzip.open('{}.txt'.format(basename)) as acd_file:
-                    myzip.close()
-                    yield acd_file.readlines()
-            elif path.isfile('{}.txt'.format(filename)):
-                with open('{}.txt'.format(filename), 'rb') as acd_file:
-                    yield acd_file.readlines()
-            else:
-                print('failed to locate file {}'.format(filename))
-                print('No records for {}'.format(self.current_date.strftime('%Y-%m-%d')))
 
-            self.current_date += datetime.timedelta(days=1)
+def parse_record(line, date):
+    if len(line) < 9 or line[2] not in RECORD_TYPES:
+        return None
+    try:
+        record_time = datetime.datetime.strptime(
+                date.strftime('%Y%m%d') + line[3:9], '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+    if line[2] in ('A', 'B'):
+        return (record_time, line[2], line[16:22].strip(),
+                line[9:16].strip(), '', '')
+    line_parts = line.split('|')
+    if len(line_parts) < 12:
+        return None
+    return (record_time, line[2], line_parts[4].replace('-', '').strip(), '',
+            line_parts[10].strip(), line_parts[7])
 
 
 class InvalidInputException(Exception):
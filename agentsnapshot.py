@@ -0,0 +1,68 @@
+import os
+import re
+import pickle
+import hashlib
+import datetime
+
+
+def get_source_key(acd_directory):
+    return hashlib.sha1(os.path.abspath(acd_directory).encode('utf-8')) \
+            .hexdigest()[:16]
+
+
+class AgentSnapshots(object):
+    file_pattern = re.compile('agents_([0-9a-f]{16})_([0-9]{8})\\.pickle$')
+
+    def __init__(self, snapshot_directory, acd_directory):
+        os.makedirs(snapshot_directory, exist_ok=True)
+        self.snapshot_directory = snapshot_directory
+        self.source = os.path.abspath(acd_directory)
+        self.source_key = get_source_key(acd_directory)
+
+
+    def get_path(self, date):
+        return os.path.join(self.snapshot_directory, 'agents_{}_{}.pickle'
+                            .format(self.source_key, date.strftime('%Y%m%d')))
+
+
+    def save(self, date, agents, replay_start):
+        snapshot_path = self.get_path(date)
+        temp_path = snapshot_path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as snapshot_file:
+                pickle.dump({'source': self.source,
+                             'replay_start': replay_start,
+                             'agents': agents}, snapshot_file,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot_path)
+        except OSError:
+            pass
+
+
+    def load(self, date):
+        try:
+            with open(self.get_path(date), 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if type(snapshot) is not dict or snapshot.get('source') != self.source:
+            return None
+        return snapshot
+
+
+    def find(self, first_date, last_date, replay_start):
+        first_day = first_date.strftime('%Y%m%d')
+        last_day = last_date.strftime('%Y%m%d')
+        days = []
+        for file in os.listdir(self.snapshot_directory):
+            match = self.file_pattern.match(file)
+            if (match is not None and match.group(1) == self.source_key and
+                    first_day <= match.group(2) <= last_day):
+                days.append(match.group(2))
+        for day in sorted(days, reverse=True):
+            date = datetime.datetime.strptime(day, '%Y%m%d')
+            snapshot = self.load(date)
+            if (snapshot is not None and
+                    snapshot['replay_start'] == replay_start):
+                return date, snapshot['agents']
+        return None, None
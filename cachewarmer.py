@@ -0,0 +1,68 @@
+import sys
+import smdrreader
+import smdrcli
+
+
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.rstrip(), file=sys.stderr)
+
+
+def warm_files(parsed_files):
+    event_count = 0
+    file_count = 0
+    for events in parsed_files:
+        if events is None:
+            continue
+        event_count += len(events)
+        file_count += 1
+    return file_count, event_count
+
+
+persist_index = smdrcli.pop_flag('-P')
+jobs = smdrcli.pop_jobs()
+
+max_size = smdrreader.DEFAULT_CACHE_SIZE
+while '-m' in sys.argv:
+    argindex = sys.argv.index('-m')
+    try:
+        max_size = int(sys.argv[argindex + 1]) * 1024 * 1024
+    except (IndexError, ValueError):
+        print('Error: -m requires a cache size in megabytes', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+if len(sys.argv) < 5:
+    print('Usage: ' + sys.argv[0] + ' [-j jobs] [-m max_megabytes] [-P]'
+          ' start_date end_date data_directory cache_directory')
+    exit()
+
+start_date = sys.argv[1]
+end_date = sys.argv[2]
+data_directory = sys.argv[3]
+cache_directory = sys.argv[4]
+
+try:
+    cache = smdrreader.SMDRCache(cache_directory, max_size)
+    smdr_reader = smdrreader.SMDRReader(data_directory, start_date, end_date,
+                                        persist_index=persist_index,
+                                        cache=cache)
+except smdrreader.InvalidInputException as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
+
+if len(smdr_reader.get_node_dirs(data_directory)) > 0:
+    parsed_files = (events for file_dict
+                    in smdr_reader.parsed_date_reader(on_error=report_error,
+                                                      jobs=jobs)
+                    for events in file_dict.values())
+else:
+    parsed_files = smdr_reader.parsed_file_reader(on_error=report_error,
+                                                  jobs=jobs)
+
+file_count, event_count = warm_files(parsed_files)
+evicted = cache.evict()
+print('{} events from {} files cached'.format(event_count, file_count),
+      file=sys.stderr)
+print('{} cache files evicted, {} bytes in cache'.format(evicted,
+      cache.total_size), file=sys.stderr)
@@ -0,0 +1,200 @@
+import sys
+import heapq
+from collections import defaultdict
+
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
+
+def get_call_key(events):
+    try:
+        return events[0].start_epoch
+    except ValueError:
+        return 0
+
+
+class CallGrouper(object):
+    def __init__(self, log=None):
+        self.log = log
+        self.parent = {}
+        self.size = {}
+        self.head = {}
+        self.tail = {}
+        self.events = []
+        self.next_event = []
+
+
+    def debug(self, message):
+        if self.log is not None:
+            self.log(message)
+
+
+    def __contains__(self, call_id):
+        return call_id in self.parent
+
+
+    def find(self, call_id):
+        root = call_id
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[call_id] != root:
+            self.parent[call_id], call_id = root, self.parent[call_id]
+        return root
+
+
+    def add_id(self, call_id):
+        self.parent[call_id] = call_id
+        self.size[call_id] = 1
+        self.head[call_id] = None
+        self.tail[call_id] = None
+
+
+    def add_event(self, call_id, event):
+        if call_id not in self.parent:
+            self.add_id(call_id)
+        root = self.find(call_id)
+        position = len(self.events)
+        self.events.append(event)
+        self.next_event.append(None)
+        if self.tail[root] is None:
+            self.head[root] = position
+        else:
+            self.next_event[self.tail[root]] = position
+        self.tail[root] = position
+
+
+    def merge_ids(self, id_one, id_two):
+        self.debug('Merging IDs {} and {}'.format(id_one, id_two))
+        root_one = self.find(id_one)
+        root_two = self.find(id_two)
+        if root_one == root_two:
+            self.debug('Already merged')
+            return
+        self.debug('Not already merged')
+        if self.tail[root_one] is None:
+            head = self.head[root_two]
+        else:
+            head = self.head[root_one]
+            if self.head[root_two] is not None:
+                self.next_event[self.tail[root_one]] = self.head[root_two]
+        if self.tail[root_two] is None:
+            tail = self.tail[root_one]
+        else:
+            tail = self.tail[root_two]
+        if self.size[root_one] < self.size[root_two]:
+            root_one, root_two = root_two, root_one
+        self.parent[root_two] = root_one
+        self.size[root_one] += self.size.pop(root_two)
+        del self.head[root_two]
+        del self.tail[root_two]
+        self.head[root_one] = head
+        self.tail[root_one] = tail
+
+
+    def associate_new_id(self, existing_id, new_id):
+        self.debug('Creating association for new ID {} with existing ID {}'
+                   .format(new_id, existing_id))
+        root = self.find(existing_id)
+        self.parent[new_id] = root
+        self.size[root] += 1
+
+
+    def associate_ids(self, id_one, id_two):
+        if id_one in self.parent and id_two in self.parent:
+            self.merge_ids(id_one, id_two)
+        elif id_one in self.parent:
+            self.associate_new_id(id_one, id_two)
+        elif id_two in self.parent:
+            self.associate_new_id(id_two, id_one)
+        else:
+            self.debug('Warning: tried to associate two new IDs: {} and {}'
+                       .format(id_one, id_two))
+
+
+    def get_group(self, call_id):
+        events = []
+        position = self.head[self.find(call_id)]
+        while position is not None:
+            events.append(self.events[position])
+            position = self.next_event[position]
+        return events
+
+
+    def get_events_by_id(self):
+        groups = {}
+        events_by_id = {}
+        for call_id in self.parent:
+            root = self.find(call_id)
+            if root not in groups:
+                groups[root] = self.get_group(root)
+            events_by_id[call_id] = groups[root]
+        return events_by_id
+
+
+class CallIndex(object):
+    def __init__(self, events):
+        self.by_call_id = defaultdict(list)
+        self.by_associated_id = defaultdict(list)
+        for position, event in enumerate(events):
+            self.by_call_id[event.call_id].append(position)
+            self.by_associated_id[event.associated_id].append(position)
+
+
+    def get_positions(self, call_ids):
+        positions = set()
+        for call_id in call_ids:
+            positions.update(self.by_call_id.get(call_id, ()))
+            positions.update(self.by_associated_id.get(call_id, ()))
+        return sorted(positions)
+
+
+class CallEmitter(object):
+    def __init__(self, output=sys.stdout, debug=False,
+                 buffer_size=OUTPUT_BUFFER_SIZE):
+        self.output = output
+        self.debug = debug
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.heap = []
+        self.pushed = 0
+        self.emitted = 0
+
+
+    def __len__(self):
+        return len(self.heap)
+
+
+    def push(self, event_lists):
+        for events in event_lists:
+            heapq.heappush(self.heap, (get_call_key(events), self.pushed,
+                                       events))
+            self.pushed += 1
+
+
+    def emit(self, before=None):
+        while len(self.heap) > 0 and (before is None or
+                                      self.heap[0][0] < before):
+            self.write_call(heapq.heappop(self.heap)[2])
+        self.flush()
+
+
+    def write_call(self, events):
+        lines = ['']
+        if self.debug:
+            lines.append('Event list id {}:'.format(id(events)))
+        lines.extend(str(event) for event in events)
+        lines.append('')
+        text = '\n'.join(lines)
+        self.buffer.append(text)
+        self.buffered += len(text)
+        self.emitted += 1
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.output.write(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+        self.output.flush()
@@ -0,0 +1,222 @@
+import os
+import codecs
+import sqlite3
+import datetime
+import smdrreader
+
+INDEX_BATCH_SIZE = 10000
+FOLLOW_MARGIN = datetime.timedelta(days=1)
+
+
+def read_line_offsets(filefullpath, start=0):
+    with smdrreader.open_file(filefullpath) as smdr_file:
+        if start > 0:
+            smdr_file.seek(start)
+        offset = start
+        for line in smdr_file:
+            yield offset, line
+            offset += len(line)
+
+
+def read_lines_at(filefullpath, offsets):
+    lines = []
+    if os.path.splitext(filefullpath)[1].lower() == '.zip':
+        with smdrreader.open_file(filefullpath) as smdr_file:
+            data = smdr_file.read()
+        for offset in sorted(offsets):
+            end = data.find(b'\n', offset)
+            lines.append((offset, data[offset:end + 1 if end >= 0 else None]))
+        return lines
+    with smdrreader.open_file(filefullpath) as smdr_file:
+        for offset in sorted(offsets):
+            smdr_file.seek(offset)
+            lines.append((offset, smdr_file.readline()))
+    return lines
+
+
+def parse_line(line, on_error=None, file_date=None):
+    for event in smdrreader.parse_events([line], on_error, file_date):
+        return event
+    return None
+
+
+def follow_call_ids(call_ids, start_date, end_date, get_locations,
+                    read_events, margin=FOLLOW_MARGIN):
+    call_ids = set(location[0] for location in get_locations(
+            call_ids, start_date.strftime('%Y%m%d'),
+            end_date.strftime('%Y%m%d')))
+    first_day = (start_date - margin).strftime('%Y%m%d')
+    last_day = (end_date + margin).strftime('%Y%m%d')
+    seen_ids = set()
+    seen_locations = set()
+    found = []
+    while len(call_ids) > 0:
+        seen_ids.update(call_ids)
+        locations = []
+        for location in get_locations(call_ids, first_day, last_day):
+            if location[1:4] in seen_locations:
+                continue
+            seen_locations.add(location[1:4])
+            locations.append(location)
+        new_ids = set()
+        for day, node, offset, event in read_events(locations):
+            found.append((day, node, offset, event))
+            for call_id in (event.call_id, event.associated_id):
+                if call_id.strip() != '' and call_id not in seen_ids:
+                    new_ids.add(call_id)
+        call_ids = new_ids
+    return found
+
+
+class CallIDIndex(object):
+    index_filename = '.smdrcalls'
+
+    def __init__(self, index_path):
+        if os.path.isdir(index_path):
+            index_path = os.path.join(index_path, self.index_filename)
+        self.index_path = index_path
+        try:
+            self.connection = sqlite3.connect(index_path)
+        except sqlite3.Error as e:
+            raise smdrreader.InvalidInputException('Unable to open call ID '
+                                                   'index: {}'.format(str(e)))
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                file_id INTEGER PRIMARY KEY,
+                node TEXT NOT NULL,
+                day TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                UNIQUE (node, day));
+            CREATE TABLE IF NOT EXISTS ids (
+                call_id TEXT NOT NULL,
+                file_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS ids_call_id ON ids (call_id);
+            CREATE INDEX IF NOT EXISTS ids_file_id ON ids (file_id);''')
+
+
+    def close(self):
+        self.connection.close()
+
+
+    def get_file_entry(self, node, day):
+        return self.connection.execute(
+                'SELECT file_id, path, size, mtime_ns FROM files '
+                'WHERE node = ? AND day = ?', (node, day)).fetchone()
+
+
+    def remove_file(self, file_id):
+        self.connection.execute('DELETE FROM ids WHERE file_id = ?',
+                                (file_id,))
+        self.connection.execute('DELETE FROM files WHERE file_id = ?',
+                                (file_id,))
+
+
+    def update_file(self, node, date, filefullpath):
+        day = date.strftime('%Y%m%d')
+        stat = os.stat(filefullpath)
+        entry = self.get_file_entry(node, day)
+        appendable = os.path.splitext(filefullpath)[1].lower() == '.txt'
+        start = 0
+        if entry is not None:
+            file_id, path, size, mtime_ns = entry
+            if (path == filefullpath and size == stat.st_size and
+                    mtime_ns == stat.st_mtime_ns):
+                return 0
+            if (appendable and path == filefullpath and
+                    size < stat.st_size):
+                start = size
+                self.connection.execute('UPDATE files SET mtime_ns = ? '
+                                        'WHERE file_id = ?',
+                                        (stat.st_mtime_ns, file_id))
+            else:
+                self.remove_file(file_id)
+                entry = None
+        if entry is None:
+            file_id = self.connection.execute(
+                    'INSERT INTO files (node, day, path, size, mtime_ns) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (node, day, filefullpath, stat.st_size,
+                     stat.st_mtime_ns)).lastrowid
+        rows = []
+        line_count = 0
+        consumed = start
+        for offset, line in read_line_offsets(filefullpath, start):
+            if appendable and offset >= stat.st_size:
+                break
+            event_line = line
+            if offset == 0 and line.startswith(codecs.BOM_UTF8):
+                event_line = line[len(codecs.BOM_UTF8):]
+            event = parse_line(event_line)
+            if event is None and appendable and not line.endswith(b'\n'):
+                break
+            consumed = offset + len(line)
+            if event is None:
+                continue
+            line_count += 1
+            if event.call_id.strip() != '':
+                rows.append((event.call_id, file_id, offset))
+            if event.associated_id not in ('', event.call_id):
+                rows.append((event.associated_id, file_id, offset))
+            if len(rows) >= INDEX_BATCH_SIZE:
+                self.connection.executemany('INSERT INTO ids VALUES (?, ?, ?)',
+                                            rows)
+                rows = []
+        if appendable:
+            self.connection.execute('UPDATE files SET size = ? '
+                                    'WHERE file_id = ?', (consumed, file_id))
+        self.connection.executemany('INSERT INTO ids VALUES (?, ?, ?)', rows)
+        return line_count
+
+
+    def update(self, reader, dates):
+        line_count = 0
+        for dir in reader.get_node_dirs(reader.data_directory):
+            node = os.path.basename(dir)
+            for date in dates:
+                filefullpath = reader.get_directory_index(dir).get_file('s',
+                                                                        date)
+                if filefullpath is not None:
+                    line_count += self.update_file(node, date, filefullpath)
+        self.connection.commit()
+        return line_count
+
+
+    def get_locations(self, call_ids, first_day, last_day):
+        locations = []
+        call_ids = list(call_ids)
+        for index in range(0, len(call_ids), 500):
+            batch = call_ids[index:index + 500]
+            locations.extend(self.connection.execute(
+                    'SELECT ids.call_id, files.node, files.day, ids.offset, '
+                    'files.path '
+                    'FROM ids JOIN files ON ids.file_id = files.file_id '
+                    'WHERE ids.call_id IN ({}) AND files.day BETWEEN ? AND ?'
+                    .format(', '.join('?' * len(batch))),
+                    batch + [first_day, last_day]).fetchall())
+        return locations
+
+
+    def read_events(self, locations, on_error=None):
+        offsets_by_file = {}
+        for call_id, node, day, offset, path in locations:
+            offsets_by_file.setdefault((node, day, path), []).append(offset)
+        for (node, day, path), offsets in offsets_by_file.items():
+            file_date = datetime.datetime.strptime(day, '%Y%m%d').date()
+            for offset, line in read_lines_at(path, offsets):
+                if offset == 0 and line.startswith(codecs.BOM_UTF8):
+                    line = line[len(codecs.BOM_UTF8):]
+                event = parse_line(line, on_error, file_date)
+                if event is not None:
+                    yield day, node, offset, event
+
+
+    def find_events(self, call_ids, start_date, end_date, on_error=None,
+                    margin=FOLLOW_MARGIN):
+        return follow_call_ids(call_ids, start_date, end_date,
+                               self.get_locations,
+                               lambda locations: self.read_events(locations,
+                                                                  on_error),
+                               margin)
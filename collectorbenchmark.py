@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import smdrreader
+import smdrcollector
+
+
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.strip(), file=sys.stderr)
+
+
+def get_sample_lines(filefullpath):
+    lines = []
+    for event in smdrreader.parse_events(smdrreader.read_lines(filefullpath),
+                                         report_error):
+        smdr_line = event.smdr_line
+        if type(smdr_line) is str:
+            smdr_line = smdr_line.encode('UTF-8')
+        lines.append(smdr_line + b'\r\n')
+    if len(lines) == 0:
+        raise smdrreader.InvalidInputException('No SMDR events found in {}'
+                                               .format(filefullpath))
+    return lines
+
+
+async def fake_controller(port, lines, line_count):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    chunk_size = max(1, smdrreader.STREAM_BUFFER_SIZE // len(lines[0]))
+    sent = 0
+    while sent < line_count:
+        chunk = []
+        while len(chunk) < chunk_size and sent < line_count:
+            chunk.append(lines[sent % len(lines)])
+            sent += 1
+        writer.write(b''.join(chunk))
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def count_subscriber(queue, counts):
+    while True:
+        node, events = await queue.get()
+        counts[node] = counts.get(node, 0) + len(events)
+
+
+async def run_benchmark(data_directory, lines, connections, line_count,
+                        compress):
+    collector = smdrcollector.SMDRCollector(data_directory, compress=compress,
+                                            on_error=report_error)
+    counts = {}
+    if subscriber_mode is True:
+        subscriber = asyncio.ensure_future(count_subscriber(
+                collector.subscribe(), counts))
+    ports = []
+    for index in range(connections):
+        server = await collector.listen(0, 'Node_{:02}'.format(index + 1),
+                                        '127.0.0.1')
+        ports.append(server.sockets[0].getsockname()[1])
+    start_time = time.perf_counter()
+    await asyncio.gather(*(fake_controller(port, lines, line_count)
+                           for port in ports))
+    send_time = time.perf_counter() - start_time
+    while collector.event_count < connections * line_count:
+        await asyncio.sleep(0.01)
+    await collector.stop()
+    total_time = time.perf_counter() - start_time
+    if subscriber_mode is True:
+        subscriber.cancel()
+    return send_time, total_time, collector.event_count
+
+
+connections = 4
+while '-c' in sys.argv:
+    argindex = sys.argv.index('-c')
+    try:
+        connections = int(sys.argv[argindex + 1])
+    except (IndexError, ValueError):
+        print('Error: -c requires a number of connections', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+line_count = 100000
+while '-n' in sys.argv:
+    argindex = sys.argv.index('-n')
+    try:
+        line_count = int(sys.argv[argindex + 1])
+    except (IndexError, ValueError):
+        print('Error: -n requires a number of lines per connection',
+              file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+compress_mode = False
+while '-z' in sys.argv:
+    compress_mode = True
+    sys.argv.remove('-z')
+
+subscriber_mode = False
+while '-s' in sys.argv:
+    subscriber_mode = True
+    sys.argv.remove('-s')
+
+if len(sys.argv) < 2:
+    print('Usage: ' + sys.argv[0] + ' [-c connections] [-n lines] [-z] [-s]'
+          ' sample_file')
+    exit()
+
+try:
+    lines = get_sample_lines(sys.argv[1])
+except (smdrreader.InvalidInputException, OSError) as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
+
+with tempfile.TemporaryDirectory() as data_directory:
+    send_time, total_time, event_count = asyncio.run(run_benchmark(
+            data_directory, lines, connections, line_count, compress_mode))
+    written = sum(os.path.getsize(os.path.join(root, name))
+                  for root, dirs, files in os.walk(data_directory)
+                  for name in files)
+
+print('{} events from {} connections in {:.2f}s ({:.2f}s sending)'
+      .format(event_count, connections, total_time, send_time))
+print('{:.0f} events per second, {} bytes written'
+      .format(event_count / total_time, written))
@@ -0,0 +1,343 @@
+import math
+import time
+import bisect
+from collections import defaultdict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ConcurrencyCounter(object):
+    def __init__(self, extensions):
+        self.intervals = dict((extension, []) for extension in extensions)
+
+
+    def __contains__(self, extension):
+        return extension in self.intervals
+
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+    def add_call(self, extension, start, end):
+        if end > start:
+            self.intervals[extension].append((start, end))
+
+
+    def merge_intervals(self, extension, on_duplicate=None):
+        merged = []
+        for start, end in sorted(self.intervals[extension]):
+            if len(merged) > 0 and start < merged[-1][1]:
+                if on_duplicate is not None:
+                    on_duplicate(extension, start)
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            elif len(merged) > 0 and start == merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+
+    def get_changes(self, on_duplicate=None):
+        changes = []
+        for extension in self.intervals:
+            for start, end in self.merge_intervals(extension, on_duplicate):
+                changes.append((start, 1))
+                changes.append((end, -1))
+        changes.sort()
+        return changes
+
+
+    def get_segments(self, include_zero=False, on_duplicate=None):
+        segments = []
+        count = 0
+        segment_start = None
+        for timestamp, change in self.get_changes(on_duplicate):
+            if segment_start is not None and timestamp > segment_start:
+                if count > 0 or include_zero:
+                    segments.append((segment_start, timestamp, count))
+            segment_start = timestamp
+            count += change
+        return segments
+
+
+class IncrementalConcurrencyCounter(ConcurrencyCounter):
+    def __init__(self, extensions):
+        ConcurrencyCounter.__init__(self, extensions)
+        self.changes = {}
+        self.change_times = []
+        self.base_count = 0
+        self.cursor_index = 0
+        self.cursor_count = 0
+
+
+    def add_change(self, timestamp, change):
+        index = bisect.bisect_left(self.change_times, timestamp)
+        if timestamp not in self.changes:
+            self.change_times.insert(index, timestamp)
+            self.changes[timestamp] = 0
+            if index < self.cursor_index:
+                self.cursor_index += 1
+        self.changes[timestamp] += change
+        if index < self.cursor_index:
+            self.cursor_count += change
+
+
+    def add_call(self, extension, start, end, on_duplicate=None):
+        if end <= start:
+            return []
+        intervals = self.intervals[extension]
+        index = bisect.bisect_left(intervals, (start, start))
+        if index > 0 and intervals[index - 1][1] >= start:
+            index -= 1
+        pieces = []
+        merged_start = start
+        merged_end = end
+        position = start
+        last_index = index
+        while last_index < len(intervals) and intervals[last_index][0] <= end:
+            covered_start, covered_end = intervals[last_index]
+            if covered_start > position:
+                pieces.append((position, covered_start))
+            if min(end, covered_end) > max(start, covered_start) and \
+                    on_duplicate is not None:
+                on_duplicate(extension, max(start, covered_start))
+                on_duplicate = None
+            position = max(position, covered_end)
+            merged_start = min(merged_start, covered_start)
+            merged_end = max(merged_end, covered_end)
+            last_index += 1
+        if position < end:
+            pieces.append((position, end))
+        intervals[index:last_index] = [(merged_start, merged_end)]
+        for piece_start, piece_end in pieces:
+            self.add_change(piece_start, 1)
+            self.add_change(piece_end, -1)
+        return pieces
+
+
+    def count_at(self, timestamp):
+        target = bisect.bisect_right(self.change_times, timestamp)
+        while self.cursor_index < target:
+            self.cursor_count += self.changes[self.change_times[
+                    self.cursor_index]]
+            self.cursor_index += 1
+        while self.cursor_index > target:
+            self.cursor_index -= 1
+            self.cursor_count -= self.changes[self.change_times[
+                    self.cursor_index]]
+        return self.base_count + self.cursor_count
+
+
+    def get_segments(self, start, end):
+        segments = []
+        count = self.count_at(start)
+        segment_start = start
+        index = bisect.bisect_right(self.change_times, start)
+        while index < len(self.change_times) and \
+                self.change_times[index] < end:
+            change_time = self.change_times[index]
+            if change_time > segment_start:
+                segments.append((segment_start, change_time, count))
+            segment_start = change_time
+            count += self.changes[change_time]
+            index += 1
+        if end > segment_start:
+            segments.append((segment_start, end, count))
+        return segments
+
+
+    def expire(self, before):
+        index = bisect.bisect_left(self.change_times, before)
+        if self.cursor_index < index:
+            self.count_at(self.change_times[index - 1])
+        for change_time in self.change_times[:index]:
+            change = self.changes.pop(change_time)
+            self.base_count += change
+            self.cursor_count -= change
+        self.cursor_index -= index
+        del self.change_times[:index]
+        for extension, intervals in self.intervals.items():
+            index = bisect.bisect_left(intervals, (before, before))
+            while index > 0 and intervals[index - 1][1] >= before:
+                index -= 1
+            del intervals[:index]
+
+
+def merge_runs(segments):
+    runs = []
+    for start, end, count in segments:
+        if len(runs) > 0 and runs[-1][1] == start and runs[-1][2] == count:
+            runs[-1] = (runs[-1][0], end, count)
+        else:
+            runs.append((start, end, count))
+    return runs
+
+
+def count_usage(segments, number_of_extensions):
+    all_in_use_seconds = 0
+    high_use_seconds = 0
+    for start, end, count in segments:
+        if count == number_of_extensions:
+            all_in_use_seconds += end - start
+            high_use_seconds += end - start
+        elif count >= number_of_extensions * 3 / 4 or\
+                number_of_extensions - count == 1:
+            high_use_seconds += end - start
+    return high_use_seconds, all_in_use_seconds
+
+
+def split_args(args):
+    split_args = []
+    for arg in args:
+        words = arg.split(' ')
+        for word in words:
+            if '-' in word:
+                range_parts = word.split('-')
+                int_list = range(int(range_parts[0]), int(range_parts[1]) + 1)
+                split_args.extend([str(int) for int in int_list])
+            else:
+                split_args.append(word)
+    args_dict = {arg: None for arg in split_args}
+    return args_dict
+
+
+def parse_threshold(threshold, number_of_extensions):
+    if threshold[:1] in ('N', 'n'):
+        offset = threshold[1:].replace(' ', '')
+        return number_of_extensions + (int(offset) if offset != '' else 0)
+    if threshold.endswith('%'):
+        return math.ceil(number_of_extensions * float(threshold[:-1]) / 100)
+    if '/' in threshold:
+        numerator, denominator = threshold.split('/')
+        if int(denominator) == 0:
+            raise ValueError('Invalid threshold: "{}"'.format(threshold))
+        return math.ceil(number_of_extensions * int(numerator) /
+                         int(denominator))
+    return int(threshold)
+
+
+def get_period_start(timestamp, period):
+    offset = time.localtime(timestamp).tm_gmtoff
+    return timestamp - (timestamp + offset) % period
+
+
+class UsageReport(object):
+    def __init__(self, number_of_extensions, thresholds=()):
+        self.number_of_extensions = number_of_extensions
+        self.thresholds = [(threshold, parse_threshold(threshold,
+                                                       number_of_extensions))
+                           for threshold in thresholds]
+        self.threshold_seconds = [0] * len(self.thresholds)
+        self.levels = defaultdict(int)
+        self.hours = defaultdict(int)
+        self.peaks = {}
+
+
+    def add_segment(self, start, end, count):
+        self.levels[count] += end - start
+        for index, (threshold, minimum) in enumerate(self.thresholds):
+            if count >= minimum:
+                self.threshold_seconds[index] += end - start
+        if count == 0:
+            return
+        position = start
+        while position < end:
+            hour = get_period_start(position, 60 * 60)
+            hour_end = min(end, hour + 60 * 60)
+            self.hours[hour] += count * (hour_end - position)
+            day = get_period_start(position, 24 * 60 * 60)
+            if day not in self.peaks or count > self.peaks[day][0]:
+                self.peaks[day] = (count, position)
+            position = hour_end
+
+
+    def add_segments(self, segments):
+        for start, end, count in segments:
+            self.add_segment(start, end, count)
+        return self
+
+
+    def get_hourly_traffic(self):
+        return [(hour, self.hours[hour] / 3600.0)
+                for hour in sorted(self.hours)]
+
+
+    def get_busy_hours(self):
+        busy_hours = {}
+        for hour, erlangs in self.get_hourly_traffic():
+            day = get_period_start(hour, 24 * 60 * 60)
+            if day not in busy_hours or erlangs > busy_hours[day][1]:
+                busy_hours[day] = (hour, erlangs)
+        return [(day, hour, erlangs) + self.peaks[day] for day, (hour, erlangs)
+                in sorted(busy_hours.items())]
+
+
+    def get_levels(self):
+        total_seconds = sum(self.levels.values())
+        return [(count, self.levels[count],
+                 self.levels[count] * 100.0 / total_seconds)
+                for count in sorted(self.levels)]
+
+
+    def get_threshold_usage(self):
+        return [(threshold, minimum, seconds) for (threshold, minimum), seconds
+                in zip(self.thresholds, self.threshold_seconds)]
+
+
+class ConcurrencyTimeline(object):
+    def __init__(self, counter, on_duplicate=None):
+        if numpy is None:
+            raise ImportError('numpy is required for the concurrency timeline')
+        starts = []
+        ends = []
+        for extension in counter.intervals:
+            for start, end in counter.merge_intervals(extension, on_duplicate):
+                starts.append(start)
+                ends.append(end)
+        if len(starts) == 0:
+            self.start = 0
+            self.counts = numpy.zeros(0, dtype=numpy.int32)
+            return
+        starts = numpy.array(starts, dtype=numpy.int64)
+        ends = numpy.array(ends, dtype=numpy.int64)
+        self.start = int(starts.min())
+        changes = numpy.zeros(int(ends.max()) - self.start + 1,
+                              dtype=numpy.int32)
+        numpy.add.at(changes, starts - self.start, 1)
+        numpy.add.at(changes, ends - self.start, -1)
+        self.counts = numpy.cumsum(changes[:-1], dtype=numpy.int32)
+
+
+    def __len__(self):
+        return len(self.counts)
+
+
+    def count_usage(self, number_of_extensions):
+        counts = self.counts
+        all_in_use = counts == number_of_extensions
+        high_use = ((counts >= number_of_extensions * 3 / 4) |
+                    (number_of_extensions - counts == 1))
+        return (int(numpy.count_nonzero(high_use)),
+                int(numpy.count_nonzero(all_in_use)))
+
+
+    def get_runs(self):
+        if len(self.counts) == 0:
+            return []
+        boundaries = numpy.flatnonzero(numpy.diff(self.counts)) + 1
+        starts = numpy.concatenate(([0], boundaries))
+        ends = numpy.concatenate((boundaries, [len(self.counts)]))
+        return [(self.start + start, self.start + end, count)
+                for start, end, count in zip(starts.tolist(), ends.tolist(),
+                                             self.counts[starts].tolist())]
+
+
+    def get_chunks(self, chunk_size):
+        for offset in range(0, len(self.counts), chunk_size):
+            yield (self.start + offset,
+                   self.counts[offset:offset + chunk_size].tolist())
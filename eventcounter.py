@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import math
+import time
+from collections import defaultdict
+
+GROUP_PATTERN = re.compile('[^ ]+ [0-9]{3} ([0-9]{3})+')
+BUCKET_UNITS = {'m': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+HISTOGRAM_STEPS = ((120, 1), (60 * 60, 10), (24 * 60 * 60, 60))
+
+
+def get_group(event):
+    if GROUP_PATTERN.match(event.dialed_digits) is None:
+        return None
+    return event.dialed_digits[-3:]
+
+
+def parse_bucket_size(bucket_string):
+    unit = bucket_string[-1:].lower()
+    if unit not in BUCKET_UNITS or not bucket_string[:-1].isdigit() or \
+            int(bucket_string[:-1]) == 0:
+        raise ValueError('Invalid bucket size: "{}"'.format(bucket_string))
+    return int(bucket_string[:-1]) * BUCKET_UNITS[unit]
+
+
+def get_bucket_start(epoch, bucket_size):
+    offset = time.localtime(epoch).tm_gmtoff
+    return epoch - (epoch + offset) % bucket_size
+
+
+def get_histogram_bucket(value):
+    for limit, step in HISTOGRAM_STEPS:
+        if value < limit:
+            return value - value % step
+    return value - value % (60 * 60)
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+
+    def add(self, value):
+        self.counts[get_histogram_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * percent / 100.0))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(bucket, self.minimum), self.maximum)
+        return self.maximum
+
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+    def to_dict(self):
+        return {'counts': [[bucket, count] for bucket, count
+                           in self.counts.items()],
+                'count': self.count,
+                'total': self.total,
+                'minimum': self.minimum,
+                'maximum': self.maximum}
+
+
+    def load_dict(self, data):
+        other = Histogram()
+        other.counts = dict(data['counts'])
+        other.count = data['count']
+        other.total = data['total']
+        other.minimum = data['minimum']
+        other.maximum = data['maximum']
+        self.merge(other)
+
+
+class EventSummary(object):
+    def __init__(self):
+        self.duration = Histogram()
+        self.time_to_answer = Histogram()
+
+
+    def add_event(self, event):
+        try:
+            self.duration.add(event.duration_seconds)
+        except ValueError:
+            pass
+        answer_seconds = event.answer_seconds
+        if answer_seconds is not None:
+            self.time_to_answer.add(answer_seconds)
+
+
+    def merge(self, other):
+        self.duration.merge(other.duration)
+        self.time_to_answer.merge(other.time_to_answer)
+
+
+    def to_dict(self):
+        return {'duration': self.duration.to_dict(),
+                'time_to_answer': self.time_to_answer.to_dict()}
+
+
+    def load_dict(self, data):
+        self.duration.load_dict(data['duration'])
+        self.time_to_answer.load_dict(data['time_to_answer'])
+
+
+class EventCounter(object):
+    def __init__(self, bucket_size=None, summary_mode=False):
+        self.agents = defaultdict(int)
+        self.groups = defaultdict(int)
+        self.event_count = 0
+        self.bucket_size = bucket_size
+        self.agent_buckets = {}
+        self.group_buckets = {}
+        self.dialed_groups = {}
+        self.summary_mode = summary_mode
+        self.summaries = {}
+
+
+    def get_group(self, event):
+        dialed_digits = event.dialed_digits
+        if dialed_digits not in self.dialed_groups:
+            self.dialed_groups[dialed_digits] = get_group(event)
+        return self.dialed_groups[dialed_digits]
+
+
+    def add_bucket_count(self, buckets, bucket, key, count=1):
+        if bucket not in buckets:
+            buckets[bucket] = defaultdict(int)
+        buckets[bucket][key] += count
+
+
+    def get_summary(self, bucket, kind, key):
+        summary_key = (bucket, kind, key)
+        if summary_key not in self.summaries:
+            self.summaries[summary_key] = EventSummary()
+        return self.summaries[summary_key]
+
+
+    def add_summary(self, event, bucket, group):
+        self.get_summary(bucket, 'agent', event.called_party).add_event(event)
+        if group is not None:
+            self.get_summary(bucket, 'group', group).add_event(event)
+
+
+    def add_event(self, event):
+        self.event_count += 1
+        self.agents[event.called_party] += 1
+        group = self.get_group(event)
+        if group is not None:
+            self.groups[group] += 1
+        if self.bucket_size is None:
+            if self.summary_mode:
+                self.add_summary(event, None, group)
+            return group
+        try:
+            bucket = get_bucket_start(event.start_epoch, self.bucket_size)
+        except ValueError:
+            return group
+        self.add_bucket_count(self.agent_buckets, bucket, event.called_party)
+        if group is not None:
+            self.add_bucket_count(self.group_buckets, bucket, group)
+        if self.summary_mode:
+            self.add_summary(event, bucket, group)
+        return group
+
+
+    def merge(self, other):
+        self.event_count += other.event_count
+        for agent, count in other.agents.items():
+            self.agents[agent] += count
+        for group, count in other.groups.items():
+            self.groups[group] += count
+        for buckets, other_buckets in ((self.agent_buckets,
+                                        other.agent_buckets),
+                                       (self.group_buckets,
+                                        other.group_buckets)):
+            for bucket, counts in other_buckets.items():
+                for key, count in counts.items():
+                    self.add_bucket_count(buckets, bucket, key, count)
+        for summary_key, summary in other.summaries.items():
+            self.get_summary(*summary_key).merge(summary)
+
+
+    def to_dict(self):
+        return {'event_count': self.event_count,
+                'bucket_size': self.bucket_size,
+                'agents': self.agents,
+                'groups': self.groups,
+                'agent_buckets': [[bucket, counts] for bucket, counts
+                                  in self.agent_buckets.items()],
+                'group_buckets': [[bucket, counts] for bucket, counts
+                                  in self.group_buckets.items()],
+                'summaries': [list(summary_key) + [summary.to_dict()]
+                              for summary_key, summary
+                              in self.summaries.items()]}
+
+
+    def load_dict(self, data):
+        other = EventCounter(data['bucket_size'])
+        other.event_count = data['event_count']
+        other.agents.update(data['agents'])
+        other.groups.update(data['groups'])
+        other.agent_buckets = dict(data['agent_buckets'])
+        other.group_buckets = dict(data['group_buckets'])
+        for bucket, kind, key, summary_data in data['summaries']:
+            other.get_summary(bucket, kind, key).load_dict(summary_data)
+        self.merge(other)
+
+
+class RollupStore(object):
+    def __init__(self, rollup_directory, key):
+        self.rollup_directory = os.path.join(rollup_directory, key)
+        os.makedirs(self.rollup_directory, exist_ok=True)
+
+
+    def get_path(self, date):
+        return os.path.join(self.rollup_directory, 'r{}.json'.format(
+                            date.strftime('%Y%m%d')))
+
+
+    def get_sources(self, files):
+        sources = []
+        for dir, filefullpath in files:
+            if filefullpath is None:
+                sources.append([dir, None, 0, 0])
+                continue
+            stat = os.stat(filefullpath)
+            sources.append([dir, filefullpath, stat.st_size,
+                            stat.st_mtime_ns])
+        return sources
+
+
+    def load(self, date, files, bucket_size=None, summary_mode=False):
+        try:
+            with open(self.get_path(date)) as rollup_file:
+                rollup = json.load(rollup_file)
+            if rollup['sources'] != self.get_sources(files):
+                return None
+            counter = EventCounter(bucket_size, summary_mode)
+            counter.load_dict(rollup['counter'])
+            return counter
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+    def save(self, date, files, counter):
+        rollup_path = self.get_path(date)
+        temp_path = rollup_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as rollup_file:
+                json.dump({'sources': self.get_sources(files),
+                           'counter': counter.to_dict()}, rollup_file)
+            os.replace(temp_path, rollup_path)
+        except OSError:
+            pass
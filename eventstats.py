@@ -1,8 +1,13 @@
-import re
 import os
 import sys
+import time
+import json
+import hashlib
 import smdrreader
-from collections import defaultdict
+import smdrcli
+import smdrfilter
+import smdrfollow
+import eventcounter
 
 
 def debug_print(message, file=sys.stderr):
@@ -10,83 +15,187 @@ def debug_print(message, file=sys.stderr):
         print(message, file=file)
 
 
-def data_reader(reader):
-    for file_dict in reader.date_reader():
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.rstrip(), file=sys.stderr)
+    else:
+        debug_print(str(e) + ': ' + line.rstrip())
+
+
+def data_reader(reader, jobs):
+    for file_dict in reader.parsed_date_reader(on_error=report_error,
+                                               jobs=jobs):
         debug_print('Retrieved file dictionary for date {}'.format(
                     reader.current_date.strftime('%Y-%m-%d'))
                     + ' from reader containing {} files'.format(
                     len(file_dict)))
-        for dir,file in file_dict.items():
-            if file is None:
+        for dir,events in file_dict.items():
+            if events is None:
                 print('No data file found for {} in {}'.format(
                       reader.current_date.strftime('%Y-%m-%d'),dir),
                       file=sys.stderr)
                 continue
-            file_events = []
-            debug_print('{} lines read from file for {}'.format(len(file),
+            debug_print('Reading events from file for {}'.format(
                         os.path.basename(dir)))
-            for line in file:
-                line = line.decode('UTF-8-SIG')
-                try:
-                    event = smdrreader.SMDREvent(line)
-                    file_events.append(event)
-                except smdrreader.InvalidInputException as e:
-                    if e.severity > 0:
-                        print(str(e) + ': ' + line.rstrip(), file=sys.stderr)
-                    else:
-                        debug_print(str(e) + ': ' + line.rstrip())
-            debug_print('{} events processed from file'.format(len(file_events)))
-            yield file_events
-
-
-def get_events_by_filter(data, filter_condition):
-    debug_print('Processing filter condition "{}"'.format(filter_condition))
+            yield events
+
+
+def get_events_by_filter(data, filter_set):
     found_events = []
     for event in data:
-        try:
-            result = eval(filter_condition)
-        except:
-            print('Failure evaluating filter condition "{}"'
-                        .format(filter_condition), file=sys.stderr)
-            break
-        if result is True:
+        for smdr_filter in filter_set.match(event):
             found_events.append(event)
-    debug_print('{} events found matching filter condition'.format(
+    debug_print('{} events found matching filter conditions'.format(
                 len(found_events)))
     return found_events
 
 
 def print_events(events):
+    event_count = 0
     for event in events:
         print(event)
-    print('\n{} total events processed in event mode'.format(len(events)),
-          file=sys.stderr)
-
-
-def print_agent_stats(events):
-    agents = defaultdict(int)
-    for event in events:
-        agents[event.called_party] += 1
-    for agent,count in agents.items():
-        print('{}\t{}'.format(agent, count))
-    print('\n{} total events processed in agent mode'.format(len(events)),
+        event_count += 1
+    print('\n{} total events processed in event mode'.format(event_count),
           file=sys.stderr)
 
 
-def print_group_stats(events):
-    groups = defaultdict(int)
+def count_events(events, counter):
     for event in events:
-        match = re.match('[^ ]+ [0-9]{3} ([0-9]{3})+', event.dialed_digits)
-        if not match:
+        group = counter.add_event(event)
+        if group is None and mode == 'group':
             debug_print('Event does not appear to be a path call:'
                         '\n{}'.format(event))
-        else:
-            groups[event.dialed_digits[-3:]] += 1
-    for group,count in groups.items():
-        print('{}\t{}'.format(group, count))
-    print('\n{} total events processed in group mode'.format(len(events)),
-          file=sys.stderr)
+    return counter
+
+
+def get_rollup_key(data_dir, filter_conditions, bucket_size, summary_mode):
+    return hashlib.sha1(json.dumps([os.path.abspath(data_dir),
+                                    sorted(filter_conditions), bucket_size,
+                                    summary_mode])
+                        .encode('utf-8')).hexdigest()[:16]
+
+
+def count_days(reader, filter_set, jobs, rollup_store=None):
+    total = eventcounter.EventCounter(bucket_size, summary_mode)
+    if rollup_store is None:
+        for events in data_reader(reader, jobs):
+            count_events(get_events_by_filter(events, filter_set), total)
+        return total
+    dates = list(reader.get_dates())
+    node_dirs = reader.get_node_dirs(reader.data_directory)
+    day_files = dict((date, [(os.path.basename(dir),
+                              reader.get_directory_index(dir).get_file('s',
+                                                                       date))
+                             for dir in node_dirs]) for date in dates)
+    rollups = dict((date, rollup_store.load(date, day_files[date],
+                                            bucket_size, summary_mode))
+                   for date in dates)
+    files = ((filefullpath, date.date()) for date in dates
+             if rollups[date] is None for dir, filefullpath in day_files[date])
+    parsed_files = reader.parse_files(files, report_error, jobs)
+    for date in dates:
+        day_counter = rollups[date]
+        if day_counter is not None:
+            debug_print('Using rollup for date {}'.format(
+                        date.strftime('%Y-%m-%d')))
+            total.merge(day_counter)
+            continue
+        day_counter = eventcounter.EventCounter(bucket_size, summary_mode)
+        for dir, filefullpath in day_files[date]:
+            events = next(parsed_files)
+            if events is None:
+                print('No data file found for {} in {}'.format(
+                      date.strftime('%Y-%m-%d'), dir), file=sys.stderr)
+                continue
+            count_events(get_events_by_filter(events, filter_set), day_counter)
+        rollup_store.save(date, day_files[date], day_counter)
+        total.merge(day_counter)
+    return total
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if type(value) is float:
+        return '{:.1f}'.format(value)
+    return str(value)
+
+
+def get_summary_columns(summary):
+    columns = []
+    for histogram in (summary.duration, summary.time_to_answer):
+        columns.extend(histogram.percentile(percent) for percent in percentiles)
+        columns.append(histogram.mean())
+    return columns
+
+
+def print_summary_header(kind, bucketed):
+    columns = ['bucket'] if bucketed else []
+    columns.extend((kind, 'count'))
+    for name in ('duration', 'answer'):
+        columns.extend('{}_p{}'.format(name, format_value(percent))
+                       for percent in percentiles)
+        columns.append(name + '_mean')
+    print('\t'.join(columns))
+
 
+def print_counts(counter, counts, kind, bucket=None):
+    prefix = ''
+    if bucket is not None:
+        prefix = time.strftime('%Y-%m-%d %H:%M', time.localtime(bucket)) + '\t'
+    for key,count in counts.items():
+        columns = [key, count]
+        if counter.summary_mode:
+            summary = counter.summaries.get((bucket, kind, key),
+                                            eventcounter.EventSummary())
+            columns.extend(get_summary_columns(summary))
+        print(prefix + '\t'.join(format_value(column) for column in columns))
+
+
+def print_kind_stats(counter, kind, counts, buckets):
+    if counter.summary_mode:
+        print_summary_header(kind, counter.bucket_size is not None)
+    if counter.bucket_size is None:
+        print_counts(counter, counts, kind)
+        return
+    for bucket in sorted(buckets):
+        print_counts(counter, buckets[bucket], kind, bucket)
+
+
+def print_agent_stats(counter):
+    print_kind_stats(counter, 'agent', counter.agents, counter.agent_buckets)
+    print('\n{} total events processed in agent mode'.format(
+          counter.event_count), file=sys.stderr)
+
+
+def print_group_stats(counter):
+    print_kind_stats(counter, 'group', counter.groups, counter.group_buckets)
+    print('\n{} total events processed in group mode'.format(
+          counter.event_count), file=sys.stderr)
+
+
+def print_stats(counter):
+    if mode == 'agent':
+        print_agent_stats(counter)
+    elif mode == 'group':
+        print_group_stats(counter)
+
+
+def follow_events(data_dir, filter_set):
+    follower = smdrfollow.SMDRFollower(data_dir, on_error=report_error)
+    counter = eventcounter.EventCounter(bucket_size, summary_mode)
+    for events in follower.follow():
+        found_events = get_events_by_filter(events, filter_set)
+        if len(found_events) == 0:
+            continue
+        if mode == 'event':
+            for event in found_events:
+                print(event)
+        else:
+            count_events(found_events, counter)
+            print('\n{}'.format(time.strftime('%Y-%m-%d %H:%M:%S')))
+            print_stats(counter)
+        sys.stdout.flush()
 
 
 filter_conditions = set()
@@ -120,28 +229,95 @@ while '-f' in sys.argv:
     sys.argv.remove('-f')
     sys.argv.remove(parameter)
 
+reader_options = smdrcli.ReaderOptions()
+jobs = reader_options.jobs
+db_path = reader_options.db_path
+
+bucket_size = None
+while '-b' in sys.argv:
+    argindex = sys.argv.index('-b')
+    try:
+        bucket_size = eventcounter.parse_bucket_size(sys.argv[argindex + 1])
+    except IndexError:
+        print('Error: -b requires a bucket size such as 15m, 1h or 1d',
+              file=sys.stderr)
+        sys.exit(1)
+    except ValueError as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+summary_mode = False
+while '-s' in sys.argv:
+    summary_mode = True
+    sys.argv.remove('-s')
+
+percentiles = [50, 90, 99]
+while '-p' in sys.argv:
+    argindex = sys.argv.index('-p')
+    try:
+        percentiles = [float(percent) if '.' in percent else int(percent)
+                       for percent in sys.argv[argindex + 1].split(',')]
+    except (IndexError, ValueError):
+        print('Error: -p requires a comma separated list of percentiles',
+              file=sys.stderr)
+        sys.exit(1)
+    if any(percent <= 0 or percent > 100 for percent in percentiles):
+        print('Error: percentiles must be between 0 and 100', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+rollup_directory = None
+while '-R' in sys.argv:
+    argindex = sys.argv.index('-R')
+    try:
+        rollup_directory = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -R requires a rollup directory', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+if rollup_directory is not None and db_path is not None:
+    print('Error: -R cannot be combined with --db', file=sys.stderr)
+    sys.exit(1)
+
+follow_mode = False
+while '-F' in sys.argv:
+    follow_mode = True
+    sys.argv.remove('-F')
+
+if follow_mode is True:
+    try:
+        filter_set = smdrfilter.SMDRFilterSet(filter_conditions)
+        follow_events(sys.argv[1], filter_set)
+    except smdrreader.InvalidInputException as e:
+        print('Error: ' + str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
 start_date = sys.argv[1]
 end_date = sys.argv[2]
 data_dir = sys.argv[3]
 
 try:
-    smdr_reader = smdrreader.SMDRReader(data_dir, start_date, end_date)
+    smdr_reader = reader_options.get_reader(data_dir, start_date, end_date,
+                                            on_error=report_error)
     debug_print('SMDRReader created successfully')
-except smdrreader.InvalidInputException as e:
+    filter_set = smdrfilter.SMDRFilterSet(filter_conditions)
+    rollup_store = None
+    if rollup_directory is not None:
+        rollup_store = eventcounter.RollupStore(
+                rollup_directory, get_rollup_key(data_dir, filter_conditions,
+                                                 bucket_size, summary_mode))
+except (smdrreader.InvalidInputException, OSError) as e:
     print('Error: ' + str(e))
     sys.exit(1)
 
-filtered_events = []
-
-for events_list in data_reader(smdr_reader):
-    for condition in filter_conditions:
-            filtered_events.extend(get_events_by_filter(events_list, condition))
-
-if mode == 'agent':
-    print_agent_stats(filtered_events)
-elif mode == 'group':
-    print_group_stats(filtered_events)
+if mode in ('agent', 'group'):
+    print_stats(count_days(smdr_reader, filter_set, jobs, rollup_store))
 elif mode == 'event':
-    print_events(filtered_events)
+    print_events(event for events_list in data_reader(smdr_reader, jobs)
+                 for event in get_events_by_filter(events_list, filter_set))
 else:
     print('Please select a mode using one of -a -e -g')
@@ -0,0 +1,298 @@
+import os
+import sqlite3
+import datetime
+import smdrreader
+import acdreader
+import callidindex
+
+QUERY_BATCH_SIZE = 500
+
+
+class EventStore(object):
+    def __init__(self, db_path):
+        try:
+            self.connection = sqlite3.connect(db_path)
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    UNIQUE (kind, source, day));
+                CREATE TABLE IF NOT EXISTS smdr_events (
+                    file_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    start_epoch INTEGER,
+                    duration_seconds INTEGER,
+                    calling_party TEXT NOT NULL,
+                    called_party TEXT NOT NULL,
+                    call_id TEXT NOT NULL,
+                    associated_id TEXT NOT NULL,
+                    smdr_line TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS smdr_file
+                    ON smdr_events (file_id, position);
+                CREATE INDEX IF NOT EXISTS smdr_call_id
+                    ON smdr_events (call_id);
+                CREATE INDEX IF NOT EXISTS smdr_associated_id
+                    ON smdr_events (associated_id);
+                CREATE INDEX IF NOT EXISTS smdr_called_party
+                    ON smdr_events (called_party);
+                CREATE INDEX IF NOT EXISTS smdr_calling_party
+                    ON smdr_events (calling_party);
+                CREATE INDEX IF NOT EXISTS smdr_start_epoch
+                    ON smdr_events (start_epoch);
+                CREATE TABLE IF NOT EXISTS acd_records (
+                    file_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    epoch INTEGER NOT NULL,
+                    record_type TEXT NOT NULL,
+                    agent TEXT NOT NULL,
+                    extension TEXT NOT NULL,
+                    group_name TEXT NOT NULL,
+                    event_code TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS acd_file
+                    ON acd_records (file_id, position);
+                CREATE INDEX IF NOT EXISTS acd_agent ON acd_records (agent);
+                CREATE INDEX IF NOT EXISTS acd_epoch ON acd_records (epoch);''')
+        except sqlite3.Error as e:
+            raise smdrreader.InvalidInputException('Unable to open event '
+                                                   'store: {}'.format(str(e)))
+
+
+    def close(self):
+        self.connection.close()
+
+
+    def get_source(self, dir):
+        return os.path.abspath(dir)
+
+
+    def get_file_id(self, kind, dir, date):
+        row = self.connection.execute(
+                'SELECT file_id FROM files WHERE kind = ? AND source = ? AND '
+                'day = ?', (kind, self.get_source(dir),
+                            date.strftime('%Y%m%d'))).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+
+    def add_file(self, kind, dir, date, filefullpath):
+        source = self.get_source(dir)
+        day = date.strftime('%Y%m%d')
+        stat = os.stat(filefullpath)
+        row = self.connection.execute(
+                'SELECT file_id, path, size, mtime_ns FROM files WHERE '
+                'kind = ? AND source = ? AND day = ?',
+                (kind, source, day)).fetchone()
+        if row is not None:
+            if row[1:] == (filefullpath, stat.st_size, stat.st_mtime_ns):
+                return None
+            self.remove_file(row[0])
+        return self.connection.execute(
+                'INSERT INTO files (kind, source, day, path, size, mtime_ns) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, source, day, filefullpath, stat.st_size,
+                 stat.st_mtime_ns)).lastrowid
+
+
+    def remove_file(self, file_id):
+        self.connection.execute('DELETE FROM smdr_events WHERE file_id = ?',
+                                (file_id,))
+        self.connection.execute('DELETE FROM acd_records WHERE file_id = ?',
+                                (file_id,))
+        self.connection.execute('DELETE FROM files WHERE file_id = ?',
+                                (file_id,))
+
+
+    def get_smdr_rows(self, file_id, events):
+        for position, event in enumerate(events):
+            try:
+                start_epoch = event.start_epoch
+                duration_seconds = event.duration_seconds
+            except ValueError:
+                start_epoch = None
+                duration_seconds = None
+            yield (file_id, position, start_epoch, duration_seconds,
+                   event.calling_party, event.called_party, event.call_id,
+                   event.associated_id, event.smdr_string)
+
+
+    def get_acd_rows(self, file_id, acd_file, date):
+        position = 0
+        for bline in acd_file:
+            record = acdreader.parse_record(bline.decode('utf-8-sig'), date)
+            if record is None:
+                continue
+            yield (file_id, position, int(record[0].timestamp())) + record[1:]
+            position += 1
+
+
+    def ingest_smdr(self, dirs, dates, on_error=None):
+        file_count = 0
+        for dir in dirs:
+            directory_index = smdrreader.DirectoryIndex(dir)
+            for date in dates:
+                filefullpath = directory_index.get_file('s', date)
+                if filefullpath is None:
+                    continue
+                with self.connection:
+                    file_id = self.add_file('s', dir, date, filefullpath)
+                    if file_id is None:
+                        continue
+                    events = smdrreader.parse_events(
+                            smdrreader.read_lines(filefullpath), on_error,
+                            date.date())
+                    self.connection.executemany(
+                            'INSERT INTO smdr_events VALUES '
+                            '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            self.get_smdr_rows(file_id, events))
+                file_count += 1
+        return file_count
+
+
+    def ingest_acd(self, dirs, dates):
+        file_count = 0
+        for dir in dirs:
+            directory_index = smdrreader.DirectoryIndex(dir)
+            for date in dates:
+                filefullpath = directory_index.get_file('a', date)
+                if filefullpath is None:
+                    continue
+                with self.connection:
+                    file_id = self.add_file('a', dir, date, filefullpath)
+                    if file_id is None:
+                        continue
+                    with smdrreader.open_file(filefullpath) as acd_file:
+                        self.connection.executemany(
+                                'INSERT INTO acd_records VALUES '
+                                '(?, ?, ?, ?, ?, ?, ?, ?)',
+                                self.get_acd_rows(file_id, acd_file, date))
+                file_count += 1
+        return file_count
+
+
+    def get_events(self, dir, date):
+        file_id = self.get_file_id('s', dir, date)
+        if file_id is None:
+            return None
+        file_date = date.date()
+        return [smdrreader.restore_event(len(row[0]), row[0], file_date)
+                for row in self.connection.execute(
+                        'SELECT smdr_line FROM smdr_events WHERE file_id = ? '
+                        'ORDER BY position', (file_id,))]
+
+
+    def get_party_events(self, dir, date, parties, include_calling=True):
+        file_id = self.get_file_id('s', dir, date)
+        if file_id is None:
+            return []
+        file_date = date.date()
+        parties = list(parties)
+        positions = {}
+        for index in range(0, len(parties), QUERY_BATCH_SIZE):
+            batch = parties[index:index + QUERY_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            query = ('SELECT position, smdr_line FROM smdr_events '
+                     'WHERE file_id = ? AND (called_party IN ({})'
+                     .format(placeholders))
+            parameters = [file_id] + batch
+            if include_calling:
+                query += ' OR calling_party IN ({})'.format(placeholders)
+                parameters += batch
+            for position, smdr_line in self.connection.execute(query + ')',
+                                                               parameters):
+                positions[position] = smdr_line
+        return [smdrreader.restore_event(len(positions[position]),
+                                         positions[position], file_date)
+                for position in sorted(positions)]
+
+
+    def get_call_rows(self, call_ids, sources, first_day, last_day):
+        rows = []
+        call_ids = list(call_ids)
+        source_placeholders = ', '.join('?' * len(sources))
+        for index in range(0, len(call_ids), QUERY_BATCH_SIZE):
+            batch = call_ids[index:index + QUERY_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            for column in ('call_id', 'associated_id'):
+                rows.extend(self.connection.execute(
+                        'SELECT smdr_events.{0}, files.source, files.day, '
+                        'smdr_events.position, smdr_events.smdr_line '
+                        'FROM smdr_events JOIN files '
+                        'ON smdr_events.file_id = files.file_id '
+                        'WHERE smdr_events.{0} IN ({1}) AND files.kind = ? '
+                        'AND files.source IN ({2}) AND files.day BETWEEN ? '
+                        'AND ?'.format(column, placeholders,
+                                       source_placeholders),
+                        batch + ['s'] + sources + [first_day, last_day]))
+        return rows
+
+
+    def read_events(self, locations):
+        for call_id, source, day, position, smdr_line in locations:
+            file_date = datetime.datetime.strptime(day, '%Y%m%d').date()
+            yield (day, os.path.basename(source), position,
+                   smdrreader.restore_event(len(smdr_line), smdr_line,
+                                            file_date))
+
+
+    def find_events(self, dirs, call_ids, start_date, end_date,
+                    margin=callidindex.FOLLOW_MARGIN):
+        sources = [self.get_source(dir) for dir in dirs]
+        return callidindex.follow_call_ids(
+                call_ids, start_date, end_date,
+                lambda call_ids, first_day, last_day: self.get_call_rows(
+                        call_ids, sources, first_day, last_day),
+                self.read_events, margin)
+
+
+class StoredSMDRReader(smdrreader.SMDRReader):
+    def __init__(self, data_directory, start_date, end_date, store,
+                 on_error=None):
+        smdrreader.SMDRReader.__init__(self, data_directory, start_date,
+                                       end_date)
+        self.store = store
+        self.on_error = on_error
+
+
+    def ingest(self, dirs):
+        self.store.ingest_smdr(dirs, list(self.get_dates()), self.on_error)
+
+
+    def parsed_file_reader(self, on_error=None, jobs=1):
+        self.ingest([self.data_directory])
+        for date in self.get_dates():
+            self.current_date = date
+            events = self.store.get_events(self.data_directory, date)
+            yield events if events is not None else []
+
+
+    def parsed_date_reader(self, on_error=None, jobs=1):
+        node_dirs = self.get_node_dirs(self.data_directory)
+        self.ingest(node_dirs)
+        for date in self.get_dates():
+            self.current_date = date
+            yield dict((os.path.basename(dir), self.store.get_events(dir, date))
+                       for dir in node_dirs)
+
+
+    def parsed_party_reader(self, parties, include_calling=True):
+        self.ingest([self.data_directory])
+        for date in self.get_dates():
+            self.current_date = date
+            yield self.store.get_party_events(self.data_directory, date,
+                                              parties, include_calling)
+
+
+    def find_events(self, call_ids):
+        node_dirs = self.get_node_dirs(self.data_directory)
+        dates = ([self.start_date - callidindex.FOLLOW_MARGIN] +
+                 list(self.get_dates()) +
+                 [self.end_date + callidindex.FOLLOW_MARGIN])
+        self.store.ingest_smdr(node_dirs, dates, self.on_error)
+        return self.store.find_events(node_dirs, call_ids, self.start_date,
+                                      self.end_date)
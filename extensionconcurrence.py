@@ -1,8 +1,9 @@
 import sys
 import time
-import collections
 import smdrreader
-from os import path
+import smdrcli
+import concurrency
+import smdrfollow
 
 
 def debug_print(message, file=sys.stderr):
@@ -10,127 +11,245 @@ def debug_print(message, file=sys.stderr):
         print(message, file=file)
 
 
-def duration_to_seconds(duration):
-    duration_parts = duration.split(':')
-    hours = int(duration_parts[0])
-    minutes = int(duration_parts[1])
-    seconds = int(duration_parts[2])
-    seconds += minutes * 60
-    seconds += hours * 60 * 60
-    return seconds
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.strip(), file=sys.stderr)
+    else:
+        debug_print(str(e) + ': ' + line.strip())
 
 
-def parse_lines(smdr_lines, extension_data):
-    for line in smdr_lines:
-        line = line.decode('UTF-8-SIG')
-        try:
-            event = smdrreader.SMDREvent(line)
-        except smdrreader.InvalidInputException as e:
-            if e.severity > 0:
-                print(str(e) + ': ' + line.strip(), file=sys.stderr)
-            else:
-                debug_print(str(e) + ': ' + line.strip())
-            continue
+def report_duplicate(extension, timestamp):
+    print('Duplicate call events detected for extension ' +
+          '{} on {}'.format(extension, time.strftime('%m/%d at %H:%M:%S',
+          time.localtime(timestamp))), file=sys.stderr)
+
+
+def get_calls(events, counter):
+    for event in events:
         extension = None
-        if event.called_party in extension_data:
+        if event.called_party in counter:
             extension = event.called_party
-        elif outbound_mode is True and event.calling_party in extension_data:
+        elif outbound_mode is True and event.calling_party in counter:
             extension = event.calling_party
         if extension is not None:
             try:
-                event_start_time = time.strptime('{} {}'.format(event.date,
-                                                 event.time), '%m/%d %H:%M:%S')
-                event_duration = duration_to_seconds(event.duration)
-            except Exception as e:
+                start_timestamp = event.start_epoch
+                event_duration = event.duration_seconds
+            except ValueError as e:
                 debug_print('Error processing event time or duration: {}'
                             .format(str(e)))
-            current_timestamp = time.mktime(event_start_time)
-            end_timestamp = current_timestamp + event_duration
-            while current_timestamp < end_timestamp:
-                if extension_data[extension][current_timestamp] == True:
-                    print('Duplicate call events detected for extension ' +
-                          '{} on {} at {}'.format(
-                          extension,event.date,event.time), file=sys.stderr)
-                extension_data[extension][current_timestamp] = True
-                current_timestamp += 1
-
-
-def combine_extensions(extension_data):
-    combined_data = collections.defaultdict(int)
-    for extension in extension_data:
-        for timestamp in extension_data[extension]:
-            combined_data[timestamp] += 1
-    return combined_data
-
-
-def split_args(args):
-    split_args = []
-    for arg in args:
-        words = arg.split(' ')
-        for word in words:
-            if '-' in word:
-                range_parts = word.split('-')
-                int_list = range(int(range_parts[0]), int(range_parts[1]) + 1)
-                split_args.extend([str(int) for int in int_list])
-            else:
-                split_args.append(word)
-    args_dict = {arg: None for arg in split_args}
-    return args_dict
-
-
-def print_results_with_zeroes(data, number_of_extensions):
-    sorted_data = sorted(data)
-    current_timestamp = sorted_data[0]
-    end_timestamp = sorted_data[-1]
-    all_in_use_events = 0
-    high_use_events = 0
-
-    while current_timestamp <= end_timestamp:
-        time_string = time.strftime('%m/%d %H:%M:%S', time.localtime(current_timestamp))
-        count = data[current_timestamp]
-        if count == number_of_extensions:
-            all_in_use_events += 1
-            high_use_events += 1
-        elif count >= number_of_extensions * 3 / 4 or\
-                number_of_extensions - count == 1:
-            high_use_events += 1
-        print('{}\t{}'.format(time_string, count))
-        current_timestamp += 1
-    print('{} total seconds of high usage'.format(high_use_events), file=sys.stderr)
-    print('{} total seconds of all in use'.format(all_in_use_events), file=sys.stderr)
-
-
-def print_results(data, number_of_extensions):
-    sorted_data = sorted(data)
-    all_in_use_events = 0
-    high_use_events = 0
-
-    for timestamp in sorted_data:
-        time_string = time.strftime('%m/%d %H:%M:%S', time.localtime(timestamp))
-        count = data[timestamp]
-        if count == number_of_extensions:
-            all_in_use_events += 1
-            high_use_events += 1
-        elif count >= number_of_extensions * 3 / 4 or\
-                number_of_extensions - count == 1:
-            high_use_events += 1
-        print('{}\t{}'.format(time_string, count))
-    print('{} total seconds of high usage'.format(high_use_events), file=sys.stderr)
-    print('{} total seconds of all in use'.format(all_in_use_events), file=sys.stderr)
-
-
-def summarize(smdr_reader, extensions, zero_mode):
-    extension_data = dict((extension, collections.defaultdict(int)) for extension in extensions)
-
-    for file in smdr_reader.file_reader():
-        parse_lines(file, extension_data)
-    combined_data = combine_extensions(extension_data)
-    if zero_mode is True:
-        print_results_with_zeroes(combined_data, len(extensions))
+                continue
+            yield extension, start_timestamp, start_timestamp + event_duration
+
+
+def get_group_calls(events, extension_groups):
+    for event in events:
+        called_counters = extension_groups.get(event.called_party, ())
+        calling_counters = ()
+        if outbound_mode is True:
+            calling_counters = extension_groups.get(event.calling_party, ())
+        if len(called_counters) == 0 and len(calling_counters) == 0:
+            continue
+        try:
+            start_timestamp = event.start_epoch
+            event_duration = event.duration_seconds
+        except ValueError as e:
+            debug_print('Error processing event time or duration: {}'
+                        .format(str(e)))
+            continue
+        end_timestamp = start_timestamp + event_duration
+        for counter in called_counters:
+            yield counter, event.called_party, start_timestamp, end_timestamp
+        for counter in calling_counters:
+            if event.called_party not in counter:
+                yield (counter, event.calling_party, start_timestamp,
+                       end_timestamp)
+
+
+def parse_events(events, extension_groups):
+    for counter, extension, start_timestamp, end_timestamp in \
+            get_group_calls(events, extension_groups):
+        counter.add_call(extension, start_timestamp, end_timestamp)
+
+
+def get_extension_groups(counters):
+    extension_groups = {}
+    for counter in counters.values():
+        for extension in counter.intervals:
+            extension_groups.setdefault(extension, []).append(counter)
+    return extension_groups
+
+
+def read_group_config(config_path):
+    groups = {}
+    with open(config_path) as config_file:
+        for line in config_file:
+            line = line.split('#', 1)[0].strip()
+            if line == '':
+                continue
+            if ':' not in line:
+                raise smdrreader.InvalidInputException(
+                        'Invalid group definition: "{}"'.format(line))
+            name, extensions = line.split(':', 1)
+            groups[name.strip()] = concurrency.split_args(
+                    [' '.join(extensions.split())])
+    return groups
+
+
+def format_seconds(start, counts):
+    lines = []
+    timestamp = start
+    index = 0
+    while index < len(counts):
+        local_time = time.localtime(timestamp)
+        prefix = time.strftime('%m/%d %H:%M:', local_time)
+        run = min(60 - local_time.tm_sec, len(counts) - index)
+        for second in range(local_time.tm_sec, local_time.tm_sec + run):
+            lines.append('{}{:02d}\t{}'.format(prefix, second, counts[index]))
+            index += 1
+        timestamp += run
+    return lines
+
+
+def write_lines(lines):
+    if len(lines) > 0:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def print_segments(segments):
+    for start, end, count in segments:
+        for chunk_start in range(start, end, OUTPUT_CHUNK_SIZE):
+            chunk_end = min(chunk_start + OUTPUT_CHUNK_SIZE, end)
+            write_lines(format_seconds(chunk_start,
+                                       [count] * (chunk_end - chunk_start)))
+
+
+def print_runs(runs):
+    lines = []
+    for start, end, count in runs:
+        lines.append('{}\t{}\t{}'.format(time.strftime('%m/%d %H:%M:%S',
+                     time.localtime(start)), count, end - start))
+        if len(lines) >= OUTPUT_CHUNK_SIZE:
+            write_lines(lines)
+            lines = []
+    write_lines(lines)
+
+
+def print_usage(high_use_seconds, all_in_use_seconds):
+    print('{} total seconds of high usage'.format(high_use_seconds), file=sys.stderr)
+    print('{} total seconds of all in use'.format(all_in_use_seconds), file=sys.stderr)
+
+
+def print_results(segments, number_of_extensions):
+    if run_length_mode is True:
+        print_runs(concurrency.merge_runs(segments))
     else:
-        print_results(combined_data, len(extensions))
+        print_segments(segments)
+    print_usage(*concurrency.count_usage(segments, number_of_extensions))
 
 
+def print_timeline(timeline, number_of_extensions):
+    if run_length_mode is True:
+        print_runs(timeline.get_runs())
+    else:
+        for start, counts in timeline.get_chunks(OUTPUT_CHUNK_SIZE):
+            write_lines(format_seconds(start, counts))
+    print_usage(*timeline.count_usage(number_of_extensions))
+
+
+def print_report(segments, number_of_extensions):
+    report = concurrency.UsageReport(number_of_extensions,
+                                     thresholds).add_segments(segments)
+    print('Busy hours')
+    for day, hour, erlangs, peak, peak_time in report.get_busy_hours():
+        print('{}\t{}\t{:.2f}\t{}\t{}'.format(
+              time.strftime('%m/%d', time.localtime(day)),
+              time.strftime('%H:%M', time.localtime(hour)), erlangs, peak,
+              time.strftime('%H:%M:%S', time.localtime(peak_time))))
+    print('\nHourly traffic')
+    for hour, erlangs in report.get_hourly_traffic():
+        print('{}\t{:.2f}'.format(time.strftime('%m/%d %H:%M',
+              time.localtime(hour)), erlangs))
+    print('\nSimultaneous use')
+    for count, seconds, percent in report.get_levels():
+        print('{}\t{}\t{:.2f}%'.format(count, seconds, percent))
+    print('\nTime at or above threshold')
+    for threshold, minimum, seconds in report.get_threshold_usage():
+        print('{} ({})\t{}'.format(threshold, minimum, seconds))
+
+
+def print_counter_results(counter, zero_mode):
+    if timeline_mode is True:
+        timeline = concurrency.ConcurrencyTimeline(
+                counter, on_duplicate=report_duplicate)
+        if report_mode is True:
+            print_report(timeline.get_runs(), len(counter))
+            print_usage(*timeline.count_usage(len(counter)))
+        else:
+            print_timeline(timeline, len(counter))
+    elif report_mode is True:
+        segments = counter.get_segments(include_zero=True,
+                                        on_duplicate=report_duplicate)
+        print_report(segments, len(counter))
+        print_usage(*concurrency.count_usage(segments, len(counter)))
+    else:
+        segments = counter.get_segments(include_zero=zero_mode,
+                                        on_duplicate=report_duplicate)
+        print_results(segments, len(counter))
+
+
+def summarize(smdr_reader, groups, zero_mode, jobs):
+    counters = dict((name, concurrency.ConcurrencyCounter(extensions))
+                    for name, extensions in groups.items())
+    extension_groups = get_extension_groups(counters)
+
+    if db_path is not None:
+        parsed_files = smdr_reader.parsed_party_reader(list(extension_groups),
+                                                       outbound_mode)
+    else:
+        parsed_files = smdr_reader.parsed_file_reader(on_error=report_error,
+                                                      jobs=jobs)
+    for events in parsed_files:
+        parse_events(events, extension_groups)
+    for name, counter in counters.items():
+        if name is not None:
+            print('\nGroup {} ({} extensions)'.format(name, len(counter)))
+            print('\nGroup {}'.format(name), file=sys.stderr)
+            sys.stdout.flush()
+        print_counter_results(counter, zero_mode)
+
+
+def follow_extensions(data_directory, extensions):
+    follower = smdrfollow.SMDRFollower(data_directory, on_error=report_error)
+    counter = concurrency.IncrementalConcurrencyCounter(extensions)
+    high_use_seconds = 0
+    all_in_use_seconds = 0
+    for events in follower.follow():
+        calls = list(get_calls(events, counter))
+        if len(calls) == 0:
+            continue
+        for extension, start_timestamp, end_timestamp in calls:
+            before = concurrency.count_usage(counter.get_segments(
+                    start_timestamp, end_timestamp), len(extensions))
+            counter.add_call(extension, start_timestamp, end_timestamp,
+                             on_duplicate=report_duplicate)
+            after = concurrency.count_usage(counter.get_segments(
+                    start_timestamp, end_timestamp), len(extensions))
+            high_use_seconds += after[0] - before[0]
+            all_in_use_seconds += after[1] - before[1]
+        first_start = min(call[1] for call in calls)
+        last_end = max(call[2] for call in calls)
+        print_runs(concurrency.merge_runs(counter.get_segments(first_start,
+                                                               last_end)))
+        print_usage(high_use_seconds, all_in_use_seconds)
+        sys.stdout.flush()
+        counter.expire(last_end - FOLLOW_WINDOW)
+
+
+OUTPUT_CHUNK_SIZE = 3600
+FOLLOW_WINDOW = 24 * 60 * 60
+DEFAULT_THRESHOLDS = ['3/4', 'N-1', 'N']
+
 outbound_mode = True
 while '-i' in sys.argv:
     outbound_mode = False
@@ -141,26 +260,111 @@ while '-0' in sys.argv:
     zero_mode = True
     sys.argv.remove('-0')
 
+timeline_mode = False
+while '-n' in sys.argv:
+    timeline_mode = True
+    zero_mode = True
+    sys.argv.remove('-n')
+
+if timeline_mode is True and concurrency.numpy is None:
+    print('Error: the -n timeline mode requires numpy', file=sys.stderr)
+    sys.exit(1)
+
+run_length_mode = False
+while '-r' in sys.argv:
+    run_length_mode = True
+    sys.argv.remove('-r')
+
+report_mode = False
+while '-s' in sys.argv:
+    report_mode = True
+    sys.argv.remove('-s')
+
+thresholds = []
+while '-t' in sys.argv:
+    argindex = sys.argv.index('-t')
+    try:
+        thresholds.append(sys.argv[argindex + 1])
+    except IndexError:
+        print('Error: -t requires a threshold such as 5, 3/4, 90% or N-1',
+              file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+if len(thresholds) == 0:
+    thresholds = DEFAULT_THRESHOLDS
+
+config_path = None
+while '-g' in sys.argv:
+    argindex = sys.argv.index('-g')
+    try:
+        config_path = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -g requires a group configuration file', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
 debug_mode = False
 while '-v' in sys.argv:
     debug_mode = True
     sys.argv.remove('-v')
 
+reader_options = smdrcli.ReaderOptions()
+jobs = reader_options.jobs
+db_path = reader_options.db_path
+
+follow_mode = False
+while '-F' in sys.argv:
+    follow_mode = True
+    sys.argv.remove('-F')
+
+if follow_mode is True:
+    extensions = concurrency.split_args(sys.argv[2:])
+    for extension in extensions:
+        if not extension.isnumeric():
+            raise smdrreader.InvalidInputException('Invalid extension: "{}"'.format(extension))
+    try:
+        follow_extensions(sys.argv[1], extensions)
+    except smdrreader.InvalidInputException as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
 start_date = sys.argv[1]
 end_date = sys.argv[2]
 data_directory = sys.argv[3]
 
 try:
-    smdr_reader = smdrreader.SMDRReader(data_directory, start_date, end_date)
+    smdr_reader = reader_options.get_reader(data_directory, start_date,
+                                            end_date, on_error=report_error)
 except smdrreader.InvalidInputException as e:
     print('Error: ' + str(e), file=sys.stderr)
     sys.exit(1)
 
-extensions = split_args(sys.argv[4:])
+if config_path is not None:
+    if len(sys.argv) > 4:
+        print('Error: -g cannot be combined with extensions on the command '
+              'line', file=sys.stderr)
+        sys.exit(1)
+    try:
+        groups = read_group_config(config_path)
+    except (smdrreader.InvalidInputException, ValueError, OSError) as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(1)
+else:
+    groups = {None: concurrency.split_args(sys.argv[4:])}
 
-for extension in extensions:
-    if not extension.isnumeric():
-        raise smdrreader.InvalidInputException('Invalid extension: "{}"'.format(extension))
+for extensions in groups.values():
+    for extension in extensions:
+        if not extension.isnumeric():
+            raise smdrreader.InvalidInputException('Invalid extension: "{}"'.format(extension))
+    for threshold in thresholds:
+        try:
+            concurrency.parse_threshold(threshold, len(extensions))
+        except ValueError:
+            print('Error: invalid threshold "{}"'.format(threshold),
+                  file=sys.stderr)
+            sys.exit(1)
 
-summarize(smdr_reader, extensions, zero_mode)
+summarize(smdr_reader, groups, zero_mode, jobs)
 
@@ -0,0 +1,115 @@
+import os
+import csv
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+WRITE_BATCH_SIZE = 50000
+
+
+class CSVRecordWriter(object):
+    extension = '.csv'
+
+    def __init__(self, filefullpath, columns):
+        self.filefullpath = filefullpath
+        self.temp_path = filefullpath + '.tmp'
+        self.record_file = open(self.temp_path, 'w', newline='')
+        self.writer = csv.writer(self.record_file)
+        self.writer.writerow([name for name, column_type in columns])
+
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+
+
+    def close(self):
+        self.record_file.close()
+        os.replace(self.temp_path, self.filefullpath)
+
+
+    def abort(self):
+        self.record_file.close()
+        os.remove(self.temp_path)
+
+
+class ArrowRecordWriter(object):
+    extension = '.arrow'
+
+    def __init__(self, filefullpath, columns):
+        if pyarrow is None:
+            raise ImportError('pyarrow is required for {} output'
+                              .format(self.extension))
+        self.filefullpath = filefullpath
+        self.temp_path = filefullpath + '.tmp'
+        self.schema = pyarrow.schema([(name, self.get_arrow_type(column_type))
+                                      for name, column_type in columns])
+        self.writer = self.open_writer()
+
+
+    def get_arrow_type(self, column_type):
+        if column_type is int:
+            return pyarrow.int64()
+        return pyarrow.string()
+
+
+    def open_writer(self):
+        return pyarrow.ipc.new_file(self.temp_path, self.schema)
+
+
+    def write_batch(self, rows):
+        arrays = [pyarrow.array(values, type=field.type) for values, field
+                  in zip(zip(*rows), self.schema)]
+        self.writer.write(pyarrow.RecordBatch.from_arrays(arrays,
+                                                          schema=self.schema))
+
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.temp_path, self.filefullpath)
+
+
+    def abort(self):
+        self.writer.close()
+        os.remove(self.temp_path)
+
+
+class ParquetRecordWriter(ArrowRecordWriter):
+    extension = '.parquet'
+
+    def open_writer(self):
+        return pyarrow.parquet.ParquetWriter(self.temp_path, self.schema)
+
+
+    def write_batch(self, rows):
+        arrays = [pyarrow.array(values, type=field.type) for values, field
+                  in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays,
+                                                          schema=self.schema))
+
+
+record_writers = {'csv': CSVRecordWriter, 'arrow': ArrowRecordWriter,
+                  'parquet': ParquetRecordWriter}
+
+
+def write_records(writer, rows, batch_size=WRITE_BATCH_SIZE):
+    record_count = 0
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_batch(batch)
+                record_count += len(batch)
+                batch = []
+        if len(batch) > 0:
+            writer.write_batch(batch)
+            record_count += len(batch)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return record_count
@@ -1,9 +1,14 @@
 import re
 import os
 import sys
+import time
+import datetime
 import operator
 import smdrreader
-from collections import defaultdict
+import smdrfilter
+import callgrouper
+import callidindex
+import smdrcli
 
 
 def debug_print(message, file=sys.stderr):
@@ -11,116 +16,67 @@ def debug_print(message, file=sys.stderr):
         print(message, file=file)
 
 
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.rstrip(), file=sys.stderr)
+    else:
+        debug_print(str(e) + ': ' + line.rstrip())
+
+
 def read_all_data(file_dict, date):
     all_data = []
-    for dir,file in file_dict.items():
-        if file is None:
+    for dir,events in file_dict.items():
+        if events is None:
             print('No data file found for {} in {}'.format(
                   date.strftime('%Y-%m-%d'),dir), file=sys.stderr)
             continue
-        debug_print('{} lines read from file for {}'.format(len(file),
-                    os.path.basename(dir)))
-        for line in file:
-            line = line.decode('UTF-8-SIG')
-            try:
-                event = smdrreader.SMDREvent(line)
-                all_data.append(event)
-            except smdrreader.InvalidInputException as e:
-                if e.severity > 0:
-                    print(str(e) + ': ' + line.rstrip(), file=sys.stderr)
-                else:
-                    debug_print(str(e) + ': ' + line.rstrip())
+        file_events = len(all_data)
+        all_data.extend(events)
+        debug_print('{} events read from file for {}'.format(
+                    len(all_data) - file_events, os.path.basename(dir)))
     debug_print('{} events processed from dict'.format(len(all_data)))
     return all_data
 
 
-def add_event(call_id, event, events_by_id, ids_by_events):
-    events_by_id[call_id].append(event)
-    if id(events_by_id[call_id]) not in ids_by_events:
-        ids_by_events[id(events_by_id[call_id])].append(call_id)
-
-
-def merge_ids(id_one, id_two, events_by_id, ids_by_events):
-    debug_print('Merging IDs {} and {}'.format(id_one, id_two))
-    if events_by_id[id_one] is not events_by_id[id_two]:
-        debug_print('Not already merged')
-        events_one = events_by_id[id_one]
-        events_two = events_by_id[id_two]
-        events_references = []
-        events_references.extend(ids_by_events.pop(id(events_one)))
-        events_references.extend(ids_by_events.pop(id(events_two)))
-        new_events = []
-        new_events.extend(events_one)
-        new_events.extend(events_two)
-        for call_id in events_references:
-            events_by_id[call_id] = new_events
-        ids_by_events[id(new_events)] = events_references
-    else:
-        debug_print('Already merged')
-
-
-def associate_new_id(existing_id, new_id, events_by_id, ids_by_events):
-    debug_print('Creating association for new ID {} with existing ID {}'
-              .format(new_id, existing_id))
-    events_by_id[new_id] = events_by_id[existing_id]
-    existing_events_obj_id = id(events_by_id[existing_id])
-    ids_by_events[existing_events_obj_id].append(new_id)
-
-
-def associate_ids(id_one, id_two, events_by_id, ids_by_events):
-    if id_one in events_by_id and id_two in events_by_id:
-        merge_ids(id_one, id_two, events_by_id, ids_by_events)
-    elif id_one in events_by_id and id_two not in events_by_id:
-        associate_new_id(id_one, id_two, events_by_id, ids_by_events)
-    elif id_two in events_by_id and id_one not in events_by_id:
-        associate_new_id(id_two, id_one, events_by_id, ids_by_events)
-    else:
-        debug_print('Warning: tried to associate two new IDs: {} and {}'
-                    .format(id_one, id_two))
-
-
 def group_calls_by_id(call_ids, all_data):
-    events_by_id = defaultdict(list)
-    ids_by_events = defaultdict(list)
+    grouper = callgrouper.CallGrouper(log=debug_print)
+    index = callgrouper.CallIndex(all_data)
+    grouped = bytearray(len(all_data))
     while len(call_ids) > 0:
         assoc_ids = set()
-        my_data = all_data[:]
-        for event in all_data:
+        for position in index.get_positions(call_ids):
+            if grouped[position]:
+                continue
+            grouped[position] = 1
+            event = all_data[position]
             if event.call_id in call_ids:
                 debug_print('Found call ID {} in call_ids'
                             .format(event.call_id))
-                add_event(event.call_id, event, events_by_id, ids_by_events)
-                my_data.remove(event)
+                grouper.add_event(event.call_id, event)
                 if event.associated_id != '':
-                    associate_ids(event.associated_id, event.call_id,
-                                  events_by_id, ids_by_events)
+                    grouper.associate_ids(event.associated_id, event.call_id)
                     if event.associated_id not in call_ids:
                         assoc_ids.add(event.associated_id)
             elif event.associated_id in call_ids:
                 debug_print('Found associated ID {} in call_ids'
                             .format(event.associated_id))
-                associate_ids(event.call_id, event.associated_id,
-                              events_by_id, ids_by_events)
-                add_event(event.call_id, event, events_by_id, ids_by_events)
-                my_data.remove(event)
+                grouper.associate_ids(event.call_id, event.associated_id)
+                grouper.add_event(event.call_id, event)
                 if event.call_id not in call_ids:
                     assoc_ids.add(event.call_id)
         call_ids = assoc_ids
-        all_data = my_data
-    return events_by_id
+    return grouper.get_events_by_id()
 
 
 def group_all_calls(all_data):
-    events_by_id = defaultdict(list)
-    ids_by_events = defaultdict(list)
+    grouper = callgrouper.CallGrouper(log=debug_print)
     for event in all_data:
         if event.call_id == '        ':
             continue
-        add_event(event.call_id, event, events_by_id, ids_by_events)
+        grouper.add_event(event.call_id, event)
         if event.associated_id != '':
-            associate_ids(event.associated_id, event.call_id, events_by_id,
-                          ids_by_events)
-    return events_by_id
+            grouper.associate_ids(event.associated_id, event.call_id)
+    return grouper.get_events_by_id()
 
 
 def get_unique_calls(events_by_id):
@@ -133,16 +89,6 @@ def get_unique_calls(events_by_id):
     return unique_event_lists
 
 
-def print_calls(unique_event_lists):
-    unique_event_lists.sort(key=lambda x: x[0].time)
-    unique_event_lists.sort(key=lambda x: x[0].date)
-    for list in unique_event_lists:
-            print()
-            debug_print('Event list id {}:'.format(id(list)), file=sys.stdout)
-            print('\n'.join([str(event) for event in list]))
-    return len(unique_event_lists)
-
-
 def print_anis(unique_event_lists):
     unique_event_lists.sort(key=lambda x: x[0].ani)
     for events in unique_event_lists:
@@ -156,8 +102,7 @@ def sort_calls(call_event_lists):
     debug_print('Sorting calls')
     sorted_event_lists = []
     for event_list in call_event_lists:
-        event_list.sort(key=operator.attrgetter('sequence_id'))
-        event_list.sort(key=operator.attrgetter('call_id'))
+        event_list.sort(key=operator.attrgetter('call_id', 'sequence_id'))
         sorted_event_lists.append(event_list)
         continue
         call_id_lists = {}
@@ -222,58 +167,84 @@ def insert_events(call_id_lists, insertion):
     insert_into_list[insert_index:insert_index] = insert_list
 
 
-def get_call_ids_by_filter(all_data, filter_condition):
-    debug_print('Processing filter "{}"'.format(filter_condition))
+def get_events_by_filter(all_data, filter_set):
     call_ids = set()
+    no_id_events = []
     for event in all_data:
-        if event.call_id == '        ':
-            continue
-        try:
-            result = eval(filter_condition)
-        except:
-            print('Failure evaluating filter condition "{}"'
-                        .format(filter_condition), file=sys.stderr)
-            break
-        if result is True:
-            debug_print('Found call id {} matching filter'
-                        .format(event.call_id))
+        for smdr_filter in filter_set.match(event):
+            if event.call_id == '        ':
+                no_id_events.append([event])
+                continue
+            debug_print('Found call id {} matching filter "{}"'
+                        .format(event.call_id, smdr_filter))
             call_ids.add(event.call_id)
             if event.associated_id != '':
                 call_ids.add(event.associated_id)
-    return call_ids
+    return call_ids, no_id_events
+
+
+def get_call_end(events):
+    call_end = None
+    for event in events:
+        try:
+            event_end = event.start_epoch + event.duration_seconds
+        except ValueError:
+            continue
+        if call_end is None or event_end > call_end:
+            call_end = event_end
+    return call_end
 
 
-def get_no_id_events_by_filter(all_data, filter_condition):
-    event_lists = []
+def get_open_groups(all_data, close_time):
+    open_ids = set()
     for event in all_data:
         if event.call_id == '        ':
-            try:
-                result = eval(filter_condition)
-            except:
-                print('Failure evaluating filter condition "{}"'
-                            .format(filter_condition), file=sys.stderr)
-                break
-            if result is True:
-                event_lists.append([event])
-    return event_lists
-
-
-def process_days(reader, filter_conditions, call_ids):
-    unique_call_count = 0
-    for file_dict in reader.date_reader():
-        no_id_events = []
+            continue
+        call_end = get_call_end([event])
+        if call_end is not None and call_end >= close_time:
+            open_ids.add(event.call_id)
+    if len(open_ids) == 0:
+        return []
+    return get_unique_calls(group_calls_by_id(open_ids, all_data))
+
+
+def split_open_calls(unique_events, open_events):
+    closed_calls = []
+    open_calls = []
+    for events in unique_events:
+        if any(id(event) in open_events for event in events):
+            open_calls.append(events)
+        else:
+            closed_calls.append(events)
+    return closed_calls, open_calls
+
+
+def get_open_call_start(open_calls):
+    if len(open_calls) == 0:
+        return None
+    return min(callgrouper.get_call_key(events) for events in open_calls)
+
+
+def process_days(reader, filter_set, call_ids, jobs):
+    emitter = callgrouper.CallEmitter(debug=debug_mode)
+    open_calls = []
+    open_groups = []
+    for file_dict in reader.parsed_date_reader(on_error=report_error,
+                                               jobs=jobs):
         debug_print('Retrieved file dictionary for date {}'.format(
                     reader.current_date.strftime('%Y-%m-%d'))
                     + ' from reader containing {} files'.format(
                     len(file_dict)))
         all_data = read_all_data(file_dict, reader.current_date)
+        if len(open_groups) > 0:
+            debug_print('{} open calls carried over from previous day'
+                        .format(len(open_groups)))
+            all_data[0:0] = [event for events in open_groups
+                             for event in events]
 
-        current_call_ids = call_ids
-        for condition in filter_conditions:
-            current_call_ids = current_call_ids.union(get_call_ids_by_filter(
-                                                      all_data, condition))
-            no_id_events.extend(get_no_id_events_by_filter(all_data,
-                                                           condition))
+        filtered_call_ids, no_id_events = get_events_by_filter(all_data,
+                                                               filter_set)
+        current_call_ids = call_ids.union(filtered_call_ids)
 
         debug_print('{} call IDs selected for {}:'.format(len(current_call_ids),
                     reader.current_date.strftime('%Y-%m-%d')))
@@ -281,18 +252,61 @@ def process_days(reader, filter_conditions, call_ids):
 
         if len(current_call_ids) > 0:
             events = group_calls_by_id(current_call_ids, all_data)
-        elif len(filter_conditions) == 0:
+        elif len(filter_set) == 0:
             events = group_all_calls(all_data)
         else:
             events = {}
         unique_events = get_unique_calls(events)
-        unique_events.extend(no_id_events)
-        unique_call_count += len(unique_events)
-        sorted_calls = sort_calls(unique_events)
-        print_calls(sorted_calls)
-    print('\n{} unique calls processed'.format(unique_call_count), file=sys.stderr)
-
-
+        next_date = reader.current_date + datetime.timedelta(days=1)
+        close_time = time.mktime(next_date.timetuple()) - OPEN_CALL_WINDOW
+        open_groups = get_open_groups(all_data, close_time)
+        open_events = set(id(event) for events in open_groups
+                          for event in events)
+        closed_calls, open_calls = split_open_calls(unique_events,
+                                                    open_events)
+        closed_calls.extend(no_id_events)
+        emitter.push(sort_calls(closed_calls))
+        emitter.emit(get_open_call_start(sort_calls(open_groups)))
+    emitter.push(sort_calls(open_calls))
+    emitter.emit()
+    print('\n{} unique calls processed'.format(emitter.emitted), file=sys.stderr)
+
+
+def process_indexed_calls(reader, call_ids, index_path):
+    index = callidindex.CallIDIndex(index_path)
+    dates = ([reader.start_date - callidindex.FOLLOW_MARGIN] +
+             list(reader.get_dates()) +
+             [reader.end_date + callidindex.FOLLOW_MARGIN])
+    debug_print('{} new events added to call ID index'.format(
+                index.update(reader, dates)))
+    found = index.find_events(call_ids, reader.start_date, reader.end_date,
+                              report_error)
+    index.close()
+    debug_print('{} events read through call ID index'.format(len(found)))
+    emit_found_calls(reader, call_ids, found)
+
+
+def process_stored_calls(reader, call_ids):
+    found = reader.find_events(call_ids)
+    debug_print('{} events read from event store'.format(len(found)))
+    emit_found_calls(reader, call_ids, found)
+
+
+def emit_found_calls(reader, call_ids, found):
+    node_order = dict((os.path.basename(dir), order) for order, dir
+                      in enumerate(reader.get_node_dirs(reader.data_directory)))
+    found.sort(key=lambda location: (location[0], node_order.get(location[1]),
+                                     location[2]))
+    all_data = [event for day, node, offset, event in found]
+    events = group_calls_by_id(call_ids, all_data)
+    emitter = callgrouper.CallEmitter(debug=debug_mode)
+    emitter.push(sort_calls(get_unique_calls(events)))
+    emitter.emit()
+    print('\n{} unique calls processed'.format(emitter.emitted), file=sys.stderr)
+
+
+
+OPEN_CALL_WINDOW = 30 * 60
 
 call_ids = set()
 filter_conditions = set()
@@ -319,15 +333,40 @@ while '-c' in sys.argv:
     sys.argv.remove('-c')
     sys.argv.remove(parameter)
 
+reader_options = smdrcli.ReaderOptions()
+jobs = reader_options.jobs
+db_path = reader_options.db_path
+
+index_path = None
+while '-I' in sys.argv:
+    argindex = sys.argv.index('-I')
+    try:
+        index_path = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -I requires a call ID index path', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
 start_date = sys.argv[1]
 end_date = sys.argv[2]
 data_dir = sys.argv[3]
 
 try:
-    smdr_reader = smdrreader.SMDRReader(data_dir, start_date, end_date)
+    smdr_reader = reader_options.get_reader(data_dir, start_date, end_date,
+                                            on_error=report_error)
     debug_print('SMDRReader created successfully')
+    filter_set = smdrfilter.SMDRFilterSet(filter_conditions)
 except smdrreader.InvalidInputException as e:
     print('Error: ' + str(e), file=sys.stderr)
     sys.exit(1)
 
-process_days(smdr_reader,filter_conditions,call_ids)
+if db_path is not None and len(call_ids) > 0 and len(filter_set) == 0:
+    process_stored_calls(smdr_reader, call_ids)
+elif index_path is not None and len(call_ids) > 0 and len(filter_set) == 0:
+    try:
+        process_indexed_calls(smdr_reader, call_ids, index_path)
+    except smdrreader.InvalidInputException as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(1)
+else:
+    process_days(smdr_reader,filter_set,call_ids,jobs)
@@ -0,0 +1,56 @@
+import sys
+import smdrreader
+import eventstore
+
+
+def pop_flag(flag, argv=None):
+    if argv is None:
+        argv = sys.argv
+    found = False
+    while flag in argv:
+        found = True
+        argv.remove(flag)
+    return found
+
+
+def pop_option(flag, description, convert=None, default=None, argv=None):
+    if argv is None:
+        argv = sys.argv
+    value = default
+    while flag in argv:
+        argindex = argv.index(flag)
+        try:
+            value = argv[argindex + 1]
+            if convert is not None:
+                value = convert(value)
+        except (IndexError, ValueError):
+            print('Error: {} requires {}'.format(flag, description),
+                  file=sys.stderr)
+            sys.exit(1)
+        del argv[argindex:argindex + 2]
+    return value
+
+
+def pop_jobs(argv=None):
+    return pop_option('-j', 'a number of worker processes', int, 1, argv)
+
+
+class ReaderOptions(object):
+    def __init__(self, argv=None):
+        self.persist_index = pop_flag('-P', argv)
+        self.jobs = pop_jobs(argv)
+        self.cache_directory = pop_option('-C', 'a cache directory', argv=argv)
+        self.db_path = pop_option('--db', 'an event store path', argv=argv)
+
+
+    def get_reader(self, data_directory, start_date, end_date, on_error=None):
+        if self.db_path is not None:
+            return eventstore.StoredSMDRReader(
+                    data_directory, start_date, end_date,
+                    eventstore.EventStore(self.db_path), on_error=on_error)
+        cache = None
+        if self.cache_directory is not None:
+            cache = smdrreader.SMDRCache(self.cache_directory)
+        return smdrreader.SMDRReader(data_directory, start_date, end_date,
+                                     persist_index=self.persist_index,
+                                     cache=cache)
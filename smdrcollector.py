@@ -0,0 +1,276 @@
+import os
+import re
+import sys
+import codecs
+import asyncio
+import zipfile
+import datetime
+import smdrreader
+
+SMDR_PORT = 1752
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_QUEUE_SIZE = 256
+
+
+class DayFileWriter(object):
+    file_pattern = re.compile('s([0-9]{8})\\.txt$', re.I)
+
+    def __init__(self, directory, compress=False):
+        self.directory = directory
+        self.compress = compress
+        self.current_date = None
+        self.smdr_file = None
+
+
+    def get_path(self, date, extension='.txt'):
+        return os.path.join(self.directory, 's{}{}'.format(
+                            date.strftime('%Y%m%d'), extension))
+
+
+    def open(self, date):
+        previous_date = self.current_date
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        if self.compress:
+            if previous_date is None:
+                self.compress_finished_days(date)
+            elif previous_date < date:
+                self.compress_day(previous_date)
+        filefullpath = self.get_path(date)
+        zipfullpath = self.get_path(date, '.zip')
+        if os.path.exists(zipfullpath):
+            self.uncompress_day(date)
+        new_file = (not os.path.exists(filefullpath) or
+                    os.path.getsize(filefullpath) == 0)
+        self.smdr_file = open(filefullpath, 'ab')
+        if new_file:
+            self.smdr_file.write(codecs.BOM_UTF8)
+        self.current_date = date
+
+
+    def close(self):
+        if self.smdr_file is None:
+            return
+        self.smdr_file.close()
+        self.smdr_file = None
+
+
+    def read_day(self, date):
+        data = b''
+        zipfullpath = self.get_path(date, '.zip')
+        if os.path.exists(zipfullpath):
+            with smdrreader.open_file(zipfullpath) as smdr_file:
+                data = smdr_file.read()
+        filefullpath = self.get_path(date)
+        if os.path.exists(filefullpath):
+            with open(filefullpath, 'rb') as smdr_file:
+                text_data = smdr_file.read()
+            if len(data) > 0 and text_data.startswith(codecs.BOM_UTF8):
+                text_data = text_data[len(codecs.BOM_UTF8):]
+            if len(data) > 0 and not data.endswith(b'\n'):
+                data += b'\n'
+            data += text_data
+        return data
+
+
+    def uncompress_day(self, date):
+        filefullpath = self.get_path(date)
+        temppath = filefullpath + '.tmp'
+        with open(temppath, 'wb') as smdr_file:
+            smdr_file.write(self.read_day(date))
+        os.replace(temppath, filefullpath)
+        os.remove(self.get_path(date, '.zip'))
+
+
+    def compress_day(self, date):
+        filefullpath = self.get_path(date)
+        zipfullpath = self.get_path(date, '.zip')
+        if not os.path.exists(filefullpath):
+            return
+        temppath = zipfullpath + '.tmp'
+        with zipfile.ZipFile(temppath, 'w', zipfile.ZIP_DEFLATED) as myzip:
+            myzip.writestr(os.path.basename(filefullpath), self.read_day(date))
+        os.replace(temppath, zipfullpath)
+        os.remove(filefullpath)
+
+
+    def compress_finished_days(self, date):
+        for file in os.listdir(self.directory):
+            match = self.file_pattern.match(file)
+            if match is None:
+                continue
+            file_date = datetime.datetime.strptime(match.group(1),
+                                                   '%Y%m%d').date()
+            if file_date < date:
+                self.compress_day(file_date)
+
+
+    def write_lines(self, date, lines):
+        if date != self.current_date or self.smdr_file is None:
+            self.open(date)
+        self.smdr_file.write(b''.join(lines))
+        self.smdr_file.flush()
+
+
+class SMDRCollector(object):
+    def __init__(self, data_directory, compress=False, on_error=None,
+                 clock=None, batch_size=DEFAULT_BATCH_SIZE,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        if not os.path.isdir(data_directory):
+            raise smdrreader.InvalidInputException('The specified path does '
+                                                   'not exist')
+        self.data_directory = data_directory
+        self.compress = compress
+        self.on_error = on_error
+        self.clock = clock if clock is not None else datetime.date.today
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.queue = None
+        self.writers = {}
+        self.subscribers = []
+        self.servers = []
+        self.connections = set()
+        self.process_task = None
+        self.event_count = 0
+
+
+    def subscribe(self, queue_size=DEFAULT_QUEUE_SIZE):
+        queue = asyncio.Queue(queue_size)
+        self.subscribers.append(queue)
+        return queue
+
+
+    def unsubscribe(self, queue):
+        self.subscribers.remove(queue)
+
+
+    def get_writer(self, node):
+        if node not in self.writers:
+            if node is None:
+                directory = self.data_directory
+            else:
+                directory = os.path.join(self.data_directory, node)
+            self.writers[node] = DayFileWriter(directory, self.compress)
+        return self.writers[node]
+
+
+    async def start(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(self.queue_size)
+        if self.process_task is None:
+            self.process_task = asyncio.ensure_future(self.process())
+
+
+    async def listen(self, port=SMDR_PORT, node=None, host=None):
+        def on_connection(reader, writer):
+            return self.handle_connection(reader, writer, node)
+
+        await self.start()
+        server = await asyncio.start_server(on_connection, host, port)
+        self.servers.append(server)
+        return server
+
+
+    async def handle_connection(self, reader, writer, node):
+        self.connections.add(writer)
+        partial_line = b''
+        try:
+            while True:
+                data = await reader.read(smdrreader.STREAM_BUFFER_SIZE)
+                if not data:
+                    break
+                lines = (partial_line + data).split(b'\n')
+                partial_line = lines.pop()
+                if len(lines) > 0:
+                    await self.queue.put((node, lines))
+            if len(partial_line.strip()) > 0:
+                await self.queue.put((node, [partial_line]))
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+
+    async def process(self):
+        loop = asyncio.get_running_loop()
+        running = True
+        while running:
+            batches = [await self.queue.get()]
+            while len(batches) < self.batch_size and not self.queue.empty():
+                batches.append(self.queue.get_nowait())
+            if None in batches:
+                running = False
+                batches = [batch for batch in batches if batch is not None]
+            try:
+                await self.process_batches(loop, batches)
+            except Exception as e:
+                self.report_failure('Failed to process SMDR data', e)
+
+
+    async def process_batches(self, loop, batches):
+        file_date = self.clock()
+        lines_by_node = {}
+        events_by_node = {}
+        for node, lines in batches:
+            node_lines = lines_by_node.setdefault(node, [])
+            node_events = events_by_node.setdefault(node, [])
+            try:
+                for event in smdrreader.parse_events(lines, self.on_error,
+                                                     file_date):
+                    smdr_line = event.smdr_line
+                    if type(smdr_line) is str:
+                        smdr_line = smdr_line.encode('UTF-8')
+                    node_lines.append(smdr_line + b'\r\n')
+                    node_events.append(event)
+            except Exception as e:
+                self.report_failure('Failed to parse SMDR data', e, node)
+        await loop.run_in_executor(None, self.write_batches, file_date,
+                                   lines_by_node)
+        for node, events in events_by_node.items():
+            if len(events) == 0:
+                continue
+            self.event_count += len(events)
+            for subscriber in list(self.subscribers):
+                try:
+                    await subscriber.put((node, events))
+                except Exception as e:
+                    self.report_failure('Failed to publish SMDR events', e,
+                                        node)
+
+
+    def write_batches(self, file_date, lines_by_node):
+        for node, lines in lines_by_node.items():
+            if len(lines) == 0:
+                continue
+            try:
+                self.get_writer(node).write_lines(file_date, lines)
+            except Exception as e:
+                self.report_failure('Failed to write SMDR data', e, node)
+
+
+    def report_failure(self, message, e, node=None):
+        if node is not None:
+            message += ' for ' + node
+        print('Error: {}: {}'.format(message, e), file=sys.stderr)
+
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+        for writer in list(self.connections):
+            writer.close()
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        if self.process_task is not None:
+            await self.queue.put(None)
+            await self.process_task
+            self.process_task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close_writers)
+
+
+    def close_writers(self):
+        for writer in self.writers.values():
+            writer.close()
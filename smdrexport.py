@@ -0,0 +1,198 @@
+import os
+import sys
+import datetime
+import smdrreader
+import smdrcli
+import acdreader
+import recordwriter
+
+SMDR_COLUMNS = (('node', str), ('date', str), ('start_epoch', int),
+                ('duration_seconds', int), ('calling_party', str),
+                ('called_party', str), ('third_party', str),
+                ('dialed_digits', str), ('time_to_answer', str),
+                ('call_id', str), ('sequence_id', str),
+                ('associated_id', str), ('ani', str), ('dnis', str))
+ACD_COLUMNS = (('node', str), ('date', str), ('epoch', int),
+               ('record_type', str), ('agent', str), ('extension', str),
+               ('group', str), ('event_code', str))
+
+
+def debug_print(message, file=sys.stderr):
+    if debug_mode is True:
+        print(message, file=file)
+
+
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.strip(), file=sys.stderr)
+    else:
+        debug_print(str(e) + ': ' + line.strip())
+
+
+def get_export_dirs(data_dir):
+    node_dirs = smdrreader.get_node_dirs(data_dir)
+    if len(node_dirs) == 0:
+        return [data_dir]
+    return node_dirs
+
+
+def get_output_path(output_dir, record_type, date, node):
+    return os.path.join(output_dir, record_type, 'day={}'.format(
+                        date.strftime('%Y-%m-%d')), node + writer_type.extension)
+
+
+def is_exported(source_path, output_path):
+    try:
+        return (os.stat(output_path).st_mtime_ns >=
+                os.stat(source_path).st_mtime_ns)
+    except OSError:
+        return False
+
+
+def get_smdr_rows(events, node, date_string):
+    for event in events:
+        try:
+            start_epoch = event.start_epoch
+            duration_seconds = event.duration_seconds
+        except ValueError as e:
+            debug_print('Error processing event time or duration: {}'
+                        .format(str(e)))
+            continue
+        yield (node, date_string, start_epoch, duration_seconds,
+               event.calling_party, event.called_party, event.third_party,
+               event.dialed_digits, event.time_to_answer, event.call_id,
+               event.sequence_id, event.associated_id, event.ani, event.dnis)
+
+
+def get_acd_rows(acd_lines, node, date):
+    date_string = date.strftime('%Y-%m-%d')
+    for bline in acd_lines:
+        line = bline.decode('utf-8-sig')
+        record = acdreader.parse_record(line, date)
+        if record is None:
+            continue
+        yield (node, date_string, int(record[0].timestamp())) + record[1:]
+
+
+def needs_export(source_path, output_path):
+    if not force_mode and is_exported(source_path, output_path):
+        debug_print('Skipping {}, already exported'.format(output_path))
+        return False
+    return True
+
+
+def export_file(output_path, columns, rows):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    writer = writer_type(output_path, columns)
+    record_count = recordwriter.write_records(writer, rows)
+    debug_print('{} records exported to {}'.format(record_count, output_path))
+    return record_count
+
+
+def export_smdr(data_dir, start_date, end_date, output_dir):
+    reader = smdrreader.SMDRReader(data_dir, start_date, end_date,
+                                   persist_index=persist_index)
+    record_count = 0
+    for date in reader.get_dates():
+        for dir in get_export_dirs(data_dir):
+            filefullpath = reader.get_directory_index(dir).get_file('s', date)
+            if filefullpath is None:
+                continue
+            node = os.path.basename(os.path.normpath(dir))
+            output_path = get_output_path(output_dir, 'smdr', date, node)
+            if not needs_export(filefullpath, output_path):
+                continue
+            events = smdrreader.parse_events(
+                    smdrreader.read_lines(filefullpath), report_error,
+                    date.date())
+            rows = get_smdr_rows(events, node, date.strftime('%Y-%m-%d'))
+            record_count += export_file(output_path, SMDR_COLUMNS, rows)
+    return record_count
+
+
+def export_acd(acd_dir, start_date, end_date, output_dir):
+    record_count = 0
+    for dir in get_export_dirs(acd_dir):
+        reader = acdreader.ACDReader(dir, start_date, end_date,
+                                     persist_index=persist_index)
+        node = os.path.basename(os.path.normpath(dir))
+        date = reader.start_date
+        while date <= reader.end_date:
+            filefullpath = reader.directory_index.get_file('a', date)
+            output_path = get_output_path(output_dir, 'acd', date, node)
+            if (filefullpath is not None and
+                    needs_export(filefullpath, output_path)):
+                with smdrreader.open_file(filefullpath) as acd_file:
+                    record_count += export_file(output_path, ACD_COLUMNS,
+                                                get_acd_rows(acd_file, node,
+                                                             date))
+            date += datetime.timedelta(days=1)
+    return record_count
+
+
+debug_mode = False
+while '-v' in sys.argv:
+    debug_mode = True
+    sys.argv.remove('-v')
+
+persist_index = smdrcli.pop_flag('-P')
+
+force_mode = False
+while '-r' in sys.argv:
+    force_mode = True
+    sys.argv.remove('-r')
+
+output_format = 'parquet' if recordwriter.pyarrow is not None else 'csv'
+while '-t' in sys.argv:
+    argindex = sys.argv.index('-t')
+    try:
+        output_format = sys.argv[argindex + 1].lower()
+    except IndexError:
+        print('Error: -t requires an output format', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+acd_dir = None
+while '-a' in sys.argv:
+    argindex = sys.argv.index('-a')
+    try:
+        acd_dir = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -a requires an ACD data directory', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+if len(sys.argv) < 5:
+    print('Usage: ' + sys.argv[0] + ' [-t csv|parquet|arrow] [-a acd_directory]'
+          ' [-r] [-P] [-v] start_date end_date data_directory'
+          ' output_directory')
+    exit()
+
+if output_format not in recordwriter.record_writers:
+    print('Error: unknown output format "{}"'.format(output_format),
+          file=sys.stderr)
+    sys.exit(1)
+writer_type = recordwriter.record_writers[output_format]
+if writer_type is not recordwriter.CSVRecordWriter and \
+        recordwriter.pyarrow is None:
+    print('Error: {} output requires pyarrow'.format(output_format),
+          file=sys.stderr)
+    sys.exit(1)
+
+start_date = sys.argv[1]
+end_date = sys.argv[2]
+data_directory = sys.argv[3]
+output_directory = sys.argv[4]
+
+try:
+    smdr_count = export_smdr(data_directory, start_date, end_date,
+                             output_directory)
+    print('{} SMDR records exported'.format(smdr_count), file=sys.stderr)
+    if acd_dir is not None:
+        acd_count = export_acd(acd_dir, start_date, end_date,
+                               output_directory)
+        print('{} ACD records exported'.format(acd_count), file=sys.stderr)
+except (smdrreader.InvalidInputException,
+        acdreader.InvalidInputException) as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
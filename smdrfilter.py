@@ -0,0 +1,181 @@
+import ast
+import sys
+import operator
+from smdrreader import SMDREvent, InvalidInputException
+
+
+class SMDRFilter(object):
+    event_attributes = SMDREvent.field_names + ('smdr_string', 'start_epoch',
+                                                'duration_seconds')
+    string_methods = ('startswith', 'endswith', 'isdigit', 'isnumeric',
+                      'isalpha', 'isspace', 'strip', 'lstrip', 'rstrip',
+                      'lower', 'upper')
+    boolean_methods = ('startswith', 'endswith', 'isdigit', 'isnumeric',
+                       'isalpha', 'isspace')
+    functions = {'int': int, 'len': len}
+    comparisons = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+                   ast.In, ast.NotIn)
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.warned = False
+        try:
+            tree = ast.parse(condition.strip(), mode='eval')
+        except SyntaxError:
+            self.raise_filter_exception('invalid syntax')
+        self.check_boolean(tree.body)
+        self.predicate = self.get_fast_path(tree.body)
+        self.fast_path = self.predicate is not None
+        if self.predicate is None:
+            self.predicate = self.compile_predicate(tree.body)
+
+
+    def __call__(self, event):
+        return self.predicate(event)
+
+
+    def __str__(self):
+        return self.condition
+
+
+    def raise_filter_exception(self, reason):
+        raise InvalidInputException('Invalid filter condition "{}": {}'
+                                    .format(self.condition, reason))
+
+
+    def is_field(self, node):
+        return (isinstance(node, ast.Attribute) and
+                isinstance(node.value, ast.Name) and
+                node.value.id == 'event' and
+                node.attr in self.event_attributes)
+
+
+    def is_constant(self, node):
+        if isinstance(node, ast.Constant):
+            return type(node.value) in (str, int)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return (isinstance(node.operand, ast.Constant) and
+                    type(node.operand.value) is int)
+        if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+            return all(self.is_constant(element) for element in node.elts)
+        return False
+
+
+    def check_boolean(self, node):
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self.check_boolean(value)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            self.check_boolean(node.operand)
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if not isinstance(op, self.comparisons):
+                    self.raise_filter_exception('unsupported comparison')
+            for operand in [node.left] + node.comparators:
+                self.check_value(operand)
+        elif (isinstance(node, ast.Call) and
+              isinstance(node.func, ast.Attribute) and
+              node.func.attr in self.boolean_methods):
+            self.check_value(node)
+        elif isinstance(node, ast.Constant) and type(node.value) is bool:
+            pass
+        else:
+            self.raise_filter_exception('expression is not a condition')
+
+
+    def check_value(self, node):
+        if self.is_field(node) or self.is_constant(node):
+            return
+        if isinstance(node, ast.Call) and not node.keywords:
+            if isinstance(node.func, ast.Name):
+                if node.func.id not in self.functions or len(node.args) != 1:
+                    self.raise_filter_exception('unsupported function')
+            elif isinstance(node.func, ast.Attribute):
+                if node.func.attr not in self.string_methods:
+                    self.raise_filter_exception('unsupported method "{}"'
+                                                .format(node.func.attr))
+                self.check_value(node.func.value)
+            else:
+                self.raise_filter_exception('unsupported call')
+            for arg in node.args:
+                self.check_value(arg)
+            return
+        if isinstance(node, ast.Subscript):
+            self.check_value(node.value)
+            if isinstance(node.slice, ast.Slice):
+                for part in (node.slice.lower, node.slice.upper,
+                             node.slice.step):
+                    if part is not None:
+                        self.check_value(part)
+            else:
+                self.check_value(node.slice)
+            return
+        self.raise_filter_exception('unsupported expression')
+
+
+    def get_fast_path(self, node):
+        if (isinstance(node, ast.Compare) and len(node.ops) == 1 and
+            isinstance(node.ops[0], (ast.Eq, ast.NotEq))):
+            left, right = node.left, node.comparators[0]
+            if self.is_constant(left) and self.is_field(right):
+                left, right = right, left
+            if (self.is_field(left) and isinstance(right, ast.Constant)):
+                get_field = operator.attrgetter(left.attr)
+                value = right.value
+                if isinstance(node.ops[0], ast.Eq):
+                    return lambda event: get_field(event) == value
+                return lambda event: get_field(event) != value
+        if (isinstance(node, ast.Call) and len(node.args) == 1 and
+            isinstance(node.func, ast.Attribute) and
+            node.func.attr == 'startswith' and
+            self.is_field(node.func.value) and
+            isinstance(node.args[0], ast.Constant) and
+            type(node.args[0].value) is str):
+            get_field = operator.attrgetter(node.func.value.attr)
+            prefix = node.args[0].value
+            return lambda event: get_field(event).startswith(prefix)
+        return None
+
+
+    def compile_predicate(self, node):
+        function = ast.Expression(body=ast.Lambda(
+                args=ast.arguments(posonlyargs=[],
+                                   args=[ast.arg(arg='event')],
+                                   kwonlyargs=[], kw_defaults=[],
+                                   defaults=[]),
+                body=node))
+        ast.fix_missing_locations(function)
+        code = compile(function, '<filter "{}">'.format(self.condition),
+                       'eval')
+        namespace = {'__builtins__': {}}
+        namespace.update(self.functions)
+        return eval(code, namespace)
+
+
+class SMDRFilterSet(object):
+    def __init__(self, conditions):
+        self.filters = [SMDRFilter(condition) for condition in conditions]
+
+
+    def __len__(self):
+        return len(self.filters)
+
+
+    def __iter__(self):
+        return iter(self.filters)
+
+
+    def match(self, event):
+        matches = []
+        for smdr_filter in self.filters:
+            try:
+                result = smdr_filter.predicate(event)
+            except Exception:
+                if not smdr_filter.warned:
+                    print('Failure evaluating filter condition "{}"'
+                          .format(smdr_filter.condition), file=sys.stderr)
+                    smdr_filter.warned = True
+                continue
+            if result is True:
+                matches.append(smdr_filter)
+        return matches
@@ -0,0 +1,125 @@
+import os
+import time
+import datetime
+import smdrreader
+
+ROLLOVER_GRACE_PERIOD = 5 * 60
+
+
+class SMDRFileFollower(object):
+    def __init__(self, filefullpath, file_date):
+        self.filefullpath = filefullpath
+        self.file_date = file_date
+        self.position = 0
+        self.partial_line = b''
+        self.last_growth = None
+
+
+    def read_new_lines(self):
+        try:
+            size = os.path.getsize(self.filefullpath)
+        except OSError:
+            return []
+        if size < self.position:
+            self.position = 0
+            self.partial_line = b''
+        if size == self.position:
+            return []
+        with open(self.filefullpath, 'rb') as smdr_file:
+            smdr_file.seek(self.position)
+            data = smdr_file.read(size - self.position)
+            self.position += len(data)
+        lines = (self.partial_line + data).split(b'\n')
+        self.partial_line = lines.pop()
+        return [line + b'\n' for line in lines]
+
+
+    def read_remaining_lines(self):
+        lines = self.read_new_lines()
+        if len(self.partial_line.strip()) > 0:
+            lines.append(self.partial_line)
+        self.partial_line = b''
+        return lines
+
+
+class SMDRFollower(object):
+    def __init__(self, data_directory, on_error=None, clock=None, timer=None,
+                 grace_period=ROLLOVER_GRACE_PERIOD):
+        if not os.path.isdir(data_directory):
+            raise smdrreader.InvalidInputException('The specified path does '
+                                                   'not exist')
+        self.data_directory = data_directory
+        self.on_error = on_error
+        self.clock = clock if clock is not None else datetime.date.today
+        self.timer = timer if timer is not None else time.monotonic
+        self.grace_period = grace_period
+        self.current_date = self.clock()
+        self.followers = {}
+        self.previous_followers = []
+
+
+    def get_follow_dirs(self):
+        node_dirs = smdrreader.get_node_dirs(self.data_directory)
+        if len(node_dirs) == 0:
+            return [self.data_directory]
+        return node_dirs
+
+
+    def get_follower(self, dir):
+        if dir not in self.followers:
+            basename = 's{}.txt'.format(self.current_date.strftime('%Y%m%d'))
+            self.followers[dir] = SMDRFileFollower(os.path.join(dir, basename),
+                                                   self.current_date)
+        return self.followers[dir]
+
+
+    def read_followers(self):
+        events = []
+        for follower in self.followers.values():
+            lines = follower.read_new_lines()
+            events.extend(smdrreader.parse_events(lines, self.on_error,
+                                                  follower.file_date))
+        return events
+
+
+    def read_previous_followers(self):
+        events = []
+        now = self.timer()
+        remaining = []
+        for follower in self.previous_followers:
+            position = follower.position
+            lines = follower.read_new_lines()
+            if follower.position != position or follower.last_growth is None:
+                follower.last_growth = now
+            if now - follower.last_growth >= self.grace_period:
+                lines.extend(follower.read_remaining_lines())
+            else:
+                remaining.append(follower)
+            events.extend(smdrreader.parse_events(lines, self.on_error,
+                                                  follower.file_date))
+        self.previous_followers = remaining
+        return events
+
+
+    def poll(self):
+        events = []
+        today = self.clock()
+        if today != self.current_date:
+            events.extend(self.read_followers())
+            self.previous_followers.extend(self.followers.values())
+            self.current_date = today
+            self.followers = {}
+        events.extend(self.read_previous_followers())
+        for dir in self.get_follow_dirs():
+            self.get_follower(dir)
+        events.extend(self.read_followers())
+        return events
+
+
+    def follow(self, interval=1.0):
+        while True:
+            events = self.poll()
+            if len(events) > 0:
+                yield events
+            else:
+                time.sleep(interval)
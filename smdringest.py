@@ -0,0 +1,48 @@
+import sys
+import smdrreader
+import eventstore
+
+
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.strip(), file=sys.stderr)
+
+
+def get_ingest_dirs(data_dir):
+    return [data_dir] + smdrreader.get_node_dirs(data_dir)
+
+
+acd_dir = None
+while '-a' in sys.argv:
+    argindex = sys.argv.index('-a')
+    try:
+        acd_dir = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -a requires an ACD data directory', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+if len(sys.argv) < 5:
+    print('Usage: ' + sys.argv[0] + ' [-a acd_directory]'
+          ' start_date end_date data_directory db_path')
+    exit()
+
+start_date = sys.argv[1]
+end_date = sys.argv[2]
+data_directory = sys.argv[3]
+db_path = sys.argv[4]
+
+try:
+    smdr_reader = smdrreader.SMDRReader(data_directory, start_date, end_date)
+    store = eventstore.EventStore(db_path)
+    dates = list(smdr_reader.get_dates())
+    file_count = store.ingest_smdr(get_ingest_dirs(data_directory), dates,
+                                   report_error)
+    print('{} SMDR files ingested'.format(file_count), file=sys.stderr)
+    if acd_dir is not None:
+        file_count = store.ingest_acd(get_ingest_dirs(acd_dir), dates)
+        print('{} ACD files ingested'.format(file_count), file=sys.stderr)
+    store.close()
+except (smdrreader.InvalidInputException, OSError) as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
@@ -0,0 +1,149 @@
+import sys
+import time
+import asyncio
+import smdrreader
+import smdrcollector
+import concurrency
+import eventcounter
+
+
+def debug_print(message, file=sys.stderr):
+    if debug_mode is True:
+        print(message, file=file)
+
+
+def report_error(e, line):
+    if e.severity > 0:
+        print(str(e) + ': ' + line.strip(), file=sys.stderr)
+    else:
+        debug_print(str(e) + ': ' + line.strip())
+
+
+def parse_listen_args(args):
+    listen_args = []
+    for arg in args:
+        port, _, node = arg.partition(':')
+        if not port.isnumeric():
+            raise smdrreader.InvalidInputException('Invalid port: "{}"'
+                                                   .format(port))
+        listen_args.append((int(port), node if node != '' else None))
+    return listen_args
+
+
+async def show_concurrency(queue, extensions):
+    counter = concurrency.IncrementalConcurrencyCounter(extensions)
+    while True:
+        node, events = await queue.get()
+        for event in events:
+            if event.called_party in counter:
+                extension = event.called_party
+            elif event.calling_party in counter:
+                extension = event.calling_party
+            else:
+                continue
+            try:
+                start_timestamp = event.start_epoch
+                end_timestamp = start_timestamp + event.duration_seconds
+            except ValueError as e:
+                debug_print('Error processing event time or duration: {}'
+                            .format(str(e)))
+                continue
+            counter.add_call(extension, start_timestamp, end_timestamp)
+            print('{}\t{}\t{}'.format(time.strftime('%m/%d %H:%M:%S',
+                  time.localtime(start_timestamp)), extension,
+                  counter.count_at(start_timestamp)))
+            counter.expire(end_timestamp - FOLLOW_WINDOW)
+        sys.stdout.flush()
+
+
+async def show_agents(queue):
+    counter = eventcounter.EventCounter()
+    while True:
+        node, events = await queue.get()
+        for event in events:
+            group = counter.add_event(event)
+            print('{}\t{}\t{}\t{}'.format(node if node is not None else '',
+                  event.called_party, group if group is not None else '',
+                  counter.agents[event.called_party]))
+        sys.stdout.flush()
+
+
+async def run_collector(collector, listen_args, host):
+    if concurrency_extensions is not None:
+        asyncio.ensure_future(show_concurrency(collector.subscribe(),
+                                               concurrency_extensions))
+    if agent_mode is True:
+        asyncio.ensure_future(show_agents(collector.subscribe()))
+    for port, node in listen_args:
+        await collector.listen(port, node, host)
+        debug_print('Listening on port {} for {}'.format(port,
+                    node if node is not None else 'data directory'))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await collector.stop()
+
+
+FOLLOW_WINDOW = 24 * 60 * 60
+
+compress_mode = False
+while '-z' in sys.argv:
+    compress_mode = True
+    sys.argv.remove('-z')
+
+agent_mode = False
+while '-a' in sys.argv:
+    agent_mode = True
+    sys.argv.remove('-a')
+
+debug_mode = False
+while '-v' in sys.argv:
+    debug_mode = True
+    sys.argv.remove('-v')
+
+host = None
+while '-b' in sys.argv:
+    argindex = sys.argv.index('-b')
+    try:
+        host = sys.argv[argindex + 1]
+    except IndexError:
+        print('Error: -b requires an address to bind to', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+concurrency_extensions = None
+while '-x' in sys.argv:
+    argindex = sys.argv.index('-x')
+    try:
+        concurrency_extensions = concurrency.split_args(
+                [sys.argv[argindex + 1]])
+    except (IndexError, ValueError):
+        print('Error: -x requires a list of extensions', file=sys.stderr)
+        sys.exit(1)
+    del sys.argv[argindex:argindex + 2]
+
+if len(sys.argv) < 2:
+    print('Usage: ' + sys.argv[0] + ' [-z] [-a] [-v] [-b address]'
+          ' [-x extensions] data_directory [port[:node_directory] ...]')
+    exit()
+
+data_directory = sys.argv[1]
+
+try:
+    listen_args = parse_listen_args(sys.argv[2:])
+    if len(listen_args) == 0:
+        listen_args = [(smdrcollector.SMDR_PORT, None)]
+    collector = smdrcollector.SMDRCollector(data_directory,
+                                            compress=compress_mode,
+                                            on_error=report_error)
+except smdrreader.InvalidInputException as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
+
+try:
+    asyncio.run(run_collector(collector, listen_args, host))
+except KeyboardInterrupt:
+    pass
+except OSError as e:
+    print('Error: ' + str(e), file=sys.stderr)
+    sys.exit(1)
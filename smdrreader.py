@@ -1,11 +1,341 @@
 import re
 import os
 import sys
+import codecs
+import json
+import marshal
+import struct
+import hashlib
+import time
+import zlib
 import zipfile
 import datetime
+import multiprocessing
+from collections import deque
+
+STREAM_BUFFER_SIZE = 64 * 1024
+DEFAULT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+EPOCH_CACHE_SIZE = 256 * 1024
+TIME_PATTERNS = {207: re.compile('(?:[01][0-9]|2[0-3]):[0-5][0-9]:'
+                                 '(?:[0-5][0-9]|6[01])$'),
+                 204: re.compile('(?:[01][0-9]|2[0-3]):[0-5][0-9]$'),
+                 113: re.compile('(?:1[0-2]|0[1-9]):[0-5][0-9][AaPp]$')}
+BYTE_TIME_PATTERNS = dict((length, re.compile(pattern.pattern.encode('ascii')))
+                          for length, pattern in TIME_PATTERNS.items())
+
+epoch_cache = {}
+
+
+def open_file(filefullpath):
+    filename,fileextension = os.path.splitext(os.path.basename(filefullpath))
+    if fileextension.lower() == '.zip':
+        with zipfile.ZipFile(filefullpath) as myzip:
+            return myzip.open('{}.txt'.format(filename))
+    return open(filefullpath, 'rb', buffering=STREAM_BUFFER_SIZE)
+
+
+def get_node_dirs(data_dir):
+    node_dirs = []
+    for dir in os.listdir(data_dir):
+        if re.match('Node_\d\d+', dir, re.I) is not None:
+            node_dirs.append(os.path.join(data_dir, dir))
+    return node_dirs
+
+
+def read_lines(filefullpath):
+    with open_file(filefullpath) as smdr_file:
+        for line in smdr_file:
+            yield line
+
+
+def get_epoch(year, date, time_string):
+    key = (year, date, time_string)
+    epoch = epoch_cache.get(key)
+    if epoch is None:
+        if len(epoch_cache) >= EPOCH_CACHE_SIZE:
+            epoch_cache.clear()
+        epoch = int(time.mktime((year, int(date[0:2]), int(date[3:5]),
+                                 int(time_string[0:2]), int(time_string[3:5]),
+                                 int(time_string[6:8]), 0, 0, -1)))
+        epoch_cache[key] = epoch
+    return epoch
+
+
+def parse_events(smdr_lines, on_error=None, file_date=None):
+    first_line = True
+    for line in smdr_lines:
+        if first_line:
+            first_line = False
+            if line.startswith(codecs.BOM_UTF8):
+                line = line[len(codecs.BOM_UTF8):]
+        if not line.isascii():
+            line = line.decode('UTF-8-SIG')
+        try:
+            event = SMDREvent(line, file_date)
+        except InvalidInputException as e:
+            if on_error is not None:
+                if type(line) is bytes:
+                    line = line.decode('ascii')
+                on_error(e, line)
+            continue
+        yield event
+
+
+def parse_file(filefullpath, cache=None, file_date=None):
+    events, errors, size = parse_cached_file(filefullpath, cache, file_date)
+    if cache is not None:
+        cache.add_size(size)
+    return events, errors
+
+
+def parse_cached_file(filefullpath, cache=None, file_date=None):
+    if cache is not None:
+        cached = cache.load(filefullpath, file_date)
+        if cached is not None:
+            return cached + (None,)
+    errors = []
+    events = list(parse_events(read_lines(filefullpath),
+                               on_error=lambda e, line: errors.append((e, line)),
+                               file_date=file_date))
+    size = None
+    if cache is not None:
+        size = cache.write(filefullpath, events, errors)
+    return events, errors, size
+
+
+def restore_event(event_length, smdr_line, file_date=None):
+    event = object.__new__(SMDREvent.layouts[event_length])
+    event.smdr_line = smdr_line
+    event.file_date = file_date
+    return event
+
+
+def get_pool_context():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+
+class SMDRCache(object):
+    magic = b'SMDRC2'
+    cache_extension = '.smdrc'
+
+    def __init__(self, cache_directory, max_size=DEFAULT_CACHE_SIZE):
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+        except OSError:
+            raise InvalidInputException('Unable to create cache directory')
+        self.cache_directory = cache_directory
+        self.max_size = max_size
+        self.total_size = None
+
+
+    def get_cache_path(self, filefullpath):
+        stat = os.stat(filefullpath)
+        key = '{}|{}|{}'.format(os.path.abspath(filefullpath), stat.st_size,
+                                stat.st_mtime_ns)
+        return os.path.join(self.cache_directory,
+                            hashlib.sha1(key.encode('UTF-8')).hexdigest()
+                            + self.cache_extension)
+
+
+    def load(self, filefullpath, file_date=None):
+        cache_path = self.get_cache_path(filefullpath)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                data = cache_file.read()
+            os.utime(cache_path)
+        except OSError:
+            return None
+        if not data.startswith(self.magic):
+            return None
+        try:
+            return self.decode(data, file_date)
+        except (struct.error, ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+
+    def decode(self, data, file_date):
+        offset = len(self.magic)
+        header_length, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        runs, errors = marshal.loads(data[offset:offset + header_length])
+        blob = zlib.decompress(data[offset + header_length:])
+        is_ascii = blob.isascii()
+
+        events = []
+        position = 0
+        for record_length, count in runs:
+            end = position + record_length * count
+            columns = blob[position:end]
+            smdr_lines = [columns[index::count] for index in range(count)]
+            if not is_ascii:
+                smdr_lines = [smdr_line.decode('UTF-8') if not
+                              smdr_line.isascii() else smdr_line
+                              for smdr_line in smdr_lines]
+            for smdr_line in smdr_lines:
+                events.append(restore_event(len(smdr_line), smdr_line,
+                                            file_date))
+            position = end
+        errors = [(InvalidInputException(value, severity), line)
+                  for severity, value, line in errors]
+        return events, errors
+
+
+    def store(self, filefullpath, events, errors):
+        self.add_size(self.write(filefullpath, events, errors))
+
+
+    def get_columns(self, records):
+        run_records = b''.join(records)
+        return b''.join(run_records[index::len(records[0])]
+                        for index in range(len(records[0])))
+
+
+    def write(self, filefullpath, events, errors):
+        runs = []
+        records = []
+        for event in events:
+            record = event.smdr_line
+            if type(record) is not bytes:
+                record = record.encode('UTF-8')
+            if len(runs) > 0 and runs[-1][0] == len(record):
+                runs[-1][1] += 1
+                records[-1].append(record)
+            else:
+                runs.append([len(record), 1])
+                records.append([record])
+        header = marshal.dumps(([tuple(run) for run in runs],
+                                [(e.severity, str(e), line)
+                                 for e, line in errors]))
+        blob = zlib.compress(b''.join(self.get_columns(run_records)
+                                      for run_records in records), 1)
+
+        cache_path = self.get_cache_path(filefullpath)
+        temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as cache_file:
+                cache_file.write(self.magic)
+                cache_file.write(struct.pack('<I', len(header)))
+                cache_file.write(header)
+                cache_file.write(blob)
+            os.replace(temp_path, cache_path)
+            return os.path.getsize(cache_path)
+        except OSError:
+            return None
+
+
+    def add_size(self, size):
+        if size is None or self.max_size is None:
+            return
+        if self.total_size is None:
+            self.total_size = self.get_total_size()
+        else:
+            self.total_size += size
+        if self.total_size > self.max_size:
+            self.evict()
+
+
+    def get_entries(self):
+        entries = []
+        for file in os.listdir(self.cache_directory):
+            if not file.endswith(self.cache_extension):
+                continue
+            cache_path = os.path.join(self.cache_directory, file)
+            try:
+                stat = os.stat(cache_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, cache_path))
+        return entries
+
+
+    def get_total_size(self):
+        return sum(size for mtime, size, cache_path in self.get_entries())
+
+
+    def evict(self, max_size=None):
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self.get_entries())
+        self.total_size = sum(size for mtime, size, cache_path in entries)
+        removed = 0
+        for mtime, size, cache_path in entries:
+            if max_size is None or self.total_size <= max_size:
+                break
+            try:
+                os.remove(cache_path)
+            except OSError:
+                continue
+            self.total_size -= size
+            removed += 1
+        return removed
+
+
+class DirectoryIndex(object):
+    index_filename = '.smdrindex'
+    file_pattern = re.compile('([as])([0-9]{8})\\.(zip|txt)$', re.I)
+
+    def __init__(self, path, persist=False):
+        self.path = path
+        self.persist = persist
+        self.files = None
+        if persist:
+            self.files = self.load()
+        if self.files is None:
+            self.files = self.build()
+            if persist:
+                self.save()
+
+
+    def build(self):
+        files = {}
+        for file in os.listdir(self.path):
+            match = self.file_pattern.match(file)
+            if match is not None:
+                key = match.group(1).lower() + match.group(2)
+                if key not in files or match.group(3).lower() == 'zip':
+                    files[key] = file
+        return files
+
+
+    def load(self):
+        index_path = os.path.join(self.path, self.index_filename)
+        try:
+            if (os.stat(index_path).st_mtime_ns <
+                    os.stat(self.path).st_mtime_ns):
+                return None
+            with open(index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+
+    def save(self):
+        index_path = os.path.join(self.path, self.index_filename)
+        temp_path = index_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as index_file:
+                json.dump(self.files, index_file)
+            os.replace(temp_path, index_path)
+            os.utime(index_path)
+        except OSError:
+            pass
+
+
+    def get_file(self, prefix, date):
+        basename = self.files.get(prefix + date.strftime('%Y%m%d'))
+        if basename is None:
+            return None
+        return os.path.join(self.path, basename)
+
 
 class SMDRReader(object):
-    def __init__(self, data_directory, start_date, end_date):
+    def __init__(self, data_directory, start_date, end_date,
+                 persist_index=False, cache=None):
+        self.cache = cache
+        self.persist_index = persist_index
+        self.directory_indexes = {}
         try:
             os.listdir(data_directory)
             self.data_directory = data_directory
@@ -27,39 +357,21 @@ class SMDRReader(object):
 
 
     def get_node_dirs(self, data_dir):
-        node_dirs = []
-        for dir in os.listdir(data_dir):
-            if re.match('Node_\d\d+', dir, re.I) is not None:
-                node_dirs.append(os.path.join(data_dir, dir))
-        return node_dirs
+        return get_node_dirs(data_dir)
 
 
-    def get_file_by_date(self, path, date):
-            basename = None
-            datestring = date.strftime('%Y%m%d')
-            filelist = os.listdir(path)
-            for file in filelist:
-                if re.match('s' + datestring + '\.(zip|txt)',
-                            file, re.I) is not None:
-                    basename = file
-                    break
-            if basename is None:
-                return None
+    def get_directory_index(self, path):
+        if path not in self.directory_indexes:
+            self.directory_indexes[path] = DirectoryIndex(path,
+                                                          self.persist_index)
+        return self.directory_indexes[path]
 
-            filename,fileextension = os.path.splitext(basename)
-            filefullpath = os.path.join(path, basename)
-
-            if fileextension.lower() == '.zip':
-                myzip = zipfile.ZipFile(filefullpath)
-                with myzip.open('{}.txt'.format(filename)) as smdr_file:
-                    file_lines = smdr_file.readlines()
-                myzip.close()
-            elif fileextension.lower() == '.txt':
-                with open(filefullpath, 'rb') as smdr_file:
-                    file_lines = smdr_file.readlines()
-            else:
+
+    def get_file_by_date(self, path, date):
+            filefullpath = self.get_directory_index(path).get_file('s', date)
+            if filefullpath is None:
                 return None
-            return file_lines
+            return read_lines(filefullpath)
 
 
     def file_reader(self):
@@ -85,6 +397,84 @@ class SMDRReader(object):
             self.current_date += datetime.timedelta(days=1)
 
 
+    def get_dates(self):
+        date = self.start_date
+        while date <= self.end_date:
+            yield date
+            date += datetime.timedelta(days=1)
+
+
+    def parse_files(self, files, on_error=None, jobs=1):
+        def replay_errors(errors):
+            if on_error is not None:
+                for e, line in errors:
+                    on_error(e, line)
+
+        def collect(result):
+            if result is None:
+                return None
+            events, errors, size = result.get()
+            if self.cache is not None:
+                self.cache.add_size(size)
+            replay_errors(errors)
+            return events
+
+        context = get_pool_context()
+        if jobs <= 1 or context is None:
+            for filefullpath, date in files:
+                if filefullpath is None:
+                    yield None
+                elif self.cache is not None:
+                    events, errors = parse_file(filefullpath, self.cache, date)
+                    replay_errors(errors)
+                    yield events
+                else:
+                    yield parse_events(read_lines(filefullpath), on_error,
+                                       date)
+            return
+
+        with context.Pool(jobs) as pool:
+            pending = deque()
+            for filefullpath, date in files:
+                if filefullpath is None:
+                    pending.append(None)
+                else:
+                    pending.append(pool.apply_async(parse_cached_file,
+                                                    (filefullpath,
+                                                     self.cache, date)))
+                if len(pending) > jobs * 2:
+                    yield collect(pending.popleft())
+            while len(pending) > 0:
+                yield collect(pending.popleft())
+
+
+    def parsed_file_reader(self, on_error=None, jobs=1):
+        dates = list(self.get_dates())
+        files = ((self.get_directory_index(self.data_directory)
+                  .get_file('s', date), date.date()) for date in dates)
+        parsed_files = self.parse_files(files, on_error, jobs)
+        for date in dates:
+            self.current_date = date
+            events = next(parsed_files)
+            if events is not None:
+                yield events
+            else:
+                yield []
+
+
+    def parsed_date_reader(self, on_error=None, jobs=1):
+        dates = list(self.get_dates())
+        node_dirs = self.get_node_dirs(self.data_directory)
+        files = ((self.get_directory_index(dir).get_file('s', date),
+                  date.date()) for date in dates for dir in node_dirs)
+        parsed_files = self.parse_files(files, on_error, jobs)
+        for date in dates:
+            self.current_date = date
+            file_dict = dict((os.path.basename(dir), next(parsed_files))
+                             for dir in node_dirs)
+            yield file_dict
+
+
     def change_directory(self, new_directory):
         if os.path.isdir(new_directory):
             self.data_directory = new_directory
@@ -105,27 +495,141 @@ class InvalidInputException(Exception):
         return self.__str__()
 
 
+class SMDRField(object):
+    def __init__(self, start, end=None, strip=True):
+        self.start = start
+        self.end = start + 1 if end is None else end
+        self.strip = strip
+
+
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        value = event.smdr_line[self.start:self.end]
+        if type(value) is bytes:
+            value = value.decode('ascii')
+        if self.strip:
+            return value.strip()
+        return value
+
+
+class SMDRConstantField(object):
+    def __init__(self, value):
+        self.value = value
+
+
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        return self.value
+
+
+class SMDRLineField(object):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        if type(event.smdr_line) is bytes:
+            return event.smdr_line.decode('ascii')
+        return event.smdr_line
+
+
+class SMDRTime204Field(SMDRField):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        return SMDRField.__get__(self, event, owner) + ':00'
+
+
+class SMDRTime113Field(SMDRField):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        time_string = SMDRField.__get__(self, event, owner)
+        hour = int(time_string[0:2]) % 12
+        if time_string[5] in ('P', 'p'):
+            hour += 12
+        return '{:02d}:{}:00'.format(hour, time_string[3:5])
+
+
+class SMDRDurationField(SMDRField):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        hours, minutes, seconds = \
+                event.smdr_line[self.start:self.end].split(b':' if type(
+                event.smdr_line) is bytes else ':')
+        return int(hours) * 60 * 60 + int(minutes) * 60 + int(seconds)
+
+
+class SMDRAnswerSecondsField(SMDRField):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        answer_time = SMDRField.__get__(self, event, owner)
+        if not answer_time.isdigit():
+            return None
+        return int(answer_time)
+
+
+class SMDRStartEpochField(object):
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        date = event.date
+        if event.file_date is None:
+            year = 1900
+        else:
+            year = event.file_date.year
+            if int(date[0:2]) > event.file_date.month:
+                year -= 1
+        return get_epoch(year, date, event.time)
+
+
 class SMDREvent(object):
-    def __init__(self, smdr_string):
-        if type(smdr_string) != str:
+    __slots__ = ('smdr_line', 'file_date')
+    field_names = ('length_flag', 'date', 'time', 'duration', 'calling_party',
+                   'time_to_answer', 'dialed_digits', 'completion_flag',
+                   'speed_call_flag', 'called_party', 'trans_conf_flag',
+                   'third_party', 'system_id', 'ani', 'dnis', 'call_id',
+                   'sequence_id', 'associated_id')
+    layouts = {}
+    event_flags = (' ', '-', '%', '+')
+    byte_event_flags = tuple(flag.encode('ascii') for flag in event_flags)
+    smdr_string = SMDRLineField()
+    start_epoch = SMDRStartEpochField()
+
+    def __new__(cls, smdr_line, file_date=None):
+        if cls is not SMDREvent:
+            return object.__new__(cls)
+        if type(smdr_line) is bytes:
+            event_flags = SMDREvent.byte_event_flags
+            event_length = len(smdr_line.rstrip(b'\r\n'))
+        elif type(smdr_line) is str:
+            event_flags = SMDREvent.event_flags
+            event_length = len(smdr_line.rstrip('\r\n'))
+        else:
             raise InvalidInputException('Input is not a string', severity=1)
-        if smdr_string[0] not in (' ', '-', '%', '+'):
+        if smdr_line[:1] not in event_flags:
             raise InvalidInputException('Input string is not an SMDR event')
-        smdr_string = smdr_string.rstrip('\r\n')
-        self.smdr_string = smdr_string
-        event_length = len(smdr_string)
-
-        if event_length == 207:
-            self.validate_207(smdr_string)
-            self.init_207(smdr_string)
-        elif event_length == 204:
-            self.validate_204(smdr_string)
-            self.init_204(smdr_string)
-        elif event_length == 113:
-            self.validate_113(smdr_String)
-            self.init_113(smdr_string)
+        if event_length not in SMDREvent.layouts:
+            raise InvalidInputException('Unknown SMDR event encountered',
+                                        severity=1)
+        return object.__new__(SMDREvent.layouts[event_length])
+
+
+    def __init__(self, smdr_line, file_date=None):
+        if type(smdr_line) is bytes:
+            smdr_line = smdr_line.rstrip(b'\r\n')
         else:
-            raise InvalidInputException('Unknown SMDR event encountered', severity=1)
+            smdr_line = smdr_line.rstrip('\r\n')
+        self.validate(smdr_line)
+        self.smdr_line = smdr_line
+        self.file_date = file_date
+
+
+    def __reduce__(self):
+        return (restore_event, (len(self.smdr_line), self.smdr_line,
+                                self.file_date))
 
 
     def __str__(self):
@@ -136,137 +640,107 @@ class SMDREvent(object):
         return self.__str__()
 
 
-    def raise_validation_exception(self, length, smdr_string):
+    def raise_validation_exception(self, length, smdr_line):
+        if type(smdr_line) is bytes:
+            smdr_line = smdr_line.decode('ascii')
         raise InvalidInputException('SMDR event with length '
                                     '{} does not match expected format: {}'
-                                    .format(length, smdr_string), severity=1)
-
-
-    def init_non_event(self):
-        self.length_flag = ''
-        self.date = ''
-        self.time = ''
-        self.duration = ''
-        self.calling_party = ''
-        self.time_to_answer = ''
-        self.dialed_digits = ''
-        self.completion_flag = ''
-        self.speed_call_flag = ''
-        self.called_party = ''
-        self.trans_conf_flag = ''
-        self.third_party = ''
-        self.system_id = ''
-        self.ani = ''
-        self.dnis = ''
-        self.call_id = ''
-        self.sequence_id = ''
-        self.associated_id = ''
-
-
-    def validate_207(self, smdr_string):
-        try:
-            datetime.datetime.strptime(smdr_string[7:15], '%H:%M:%S')
-        except ValueError:
-            self.raise_validation_exception(207, smdr_string)
-        for char in (smdr_string[6],
-                     smdr_string[15],
-                     smdr_string[27],
-                     smdr_string[40],
-                     smdr_string[85],
-                     smdr_string[110]):
-            if char != ' ':
-                self.raise_validation_exception(207, smdr_string)
-
-
-    def init_207(self, smdr_string):
-        self.length_flag = smdr_string[0]
-        self.date = smdr_string[1:6]
-        self.time = smdr_string[7:15]
-        self.duration = smdr_string[17:27]
-        self.calling_party = smdr_string[28:35].strip()
-        self.time_to_answer = smdr_string[36:40].strip()
-        self.dialed_digits = smdr_string[41:67].strip()
-        self.completion_flag = smdr_string[67].strip()
-        self.speed_call_flag = smdr_string[68].strip()
-        self.called_party = smdr_string[69:76].strip()
-        self.trans_conf_flag = smdr_string[84].strip()
-        self.third_party = smdr_string[86:92].strip()
-        self.system_id = smdr_string[107:110]
-        self.ani = smdr_string[113:123].strip()
-        self.dnis = smdr_string[134:144].strip()
-        self.call_id = smdr_string[153:161]
-        self.sequence_id = smdr_string[162]
-        self.associated_id = smdr_string[164:172].strip()
-
-
-    def validate_204(self, smdr_string):
-        try:
-            datetime.datetime.strptime(smdr_string[7:12], '%H:%M')
-        except ValueError:
-            self.raise_validation_exception(204, smdr_string)
-        for char in (smdr_string[6],
-                     smdr_string[12],
-                     smdr_string[24],
-                     smdr_string[37],
-                     smdr_string[82],
-                     smdr_string[107]):
-            if char != ' ':
-                self.raise_validation_exception(204, smdr_string)
-
-
-    def init_204(self, smdr_string):
-        self.length_flag = smdr_string[0]
-        self.date = smdr_string[1:6]
-        self.time = smdr_string[7:12] + ':00'
-        self.duration = smdr_string[14:24]
-        self.calling_party = smdr_string[25:32].strip()
-        self.time_to_answer = smdr_string[33:37].strip()
-        self.dialed_digits = smdr_string[38:64].strip()
-        self.completion_flag = smdr_string[64].strip()
-        self.speed_call_flag = smdr_string[65].strip()
-        self.called_party = smdr_string[66:73].strip()
-        self.trans_conf_flag = smdr_string[81].strip()
-        self.third_party = smdr_string[83:90].strip()
-        self.system_id = smdr_string[104:107]
-        self.ani = smdr_string[110:120].strip()
-        self.dnis = smdr_string[131:141].strip()
-        self.call_id = smdr_string[150:158]
-        self.sequence_id = smdr_string[159]
-        self.associated_id = smdr_string[161:169].strip()
-
-
-    def validate_113(self, smdr_string):
-        try:
-            datetime.datetime.strptime(smdr_string[7:13] + 'M', '%I:%M%p')
-        except ValueError:
-            self.raise_validation_exception(113, smdr_string)
-        for char in (smdr_string[6],
-                     smdr_string[13],
-                     smdr_string[32],
-                     smdr_string[66],
-                     smdr_string[101]):
-            if char != ' ':
-                self.raise_validation_exception(113, smdr_string)
-
-
-    def init_113(self, smdr_string):
-        self.length_flag = smdr_string[0]
-        self.date = smdr_string[1:6]
-        time = datetime.datetime.strptime(smdr_string[7:13] + 'M', '%I:%M%p')
-        self.time = time.strftime('%H:%M:%S')
-        self.duration = smdr_string[14:22]
-        self.calling_party = smdr_string[23:28].strip()
-        self.time_to_answer = smdr_string[29:32].strip()
-        self.dialed_digits = smdr_string[33:59].strip()
-        self.completion_flag = smdr_string[59].strip()
-        self.speed_call_flag = smdr_string[60].strip()
-        self.called_party = smdr_string[61:65].strip()
-        self.trans_conf_flag = smdr_string[65].strip()
-        self.third_party = smdr_string[67:71].strip()
-        self.system_id = ''
-        self.ani = smdr_string[91:101].strip()
-        self.dnis = smdr_string[102:112].strip()
-        self.call_id = ''
-        self.sequence_id = ''
-        self.associated_id = ''
+                                    .format(length, smdr_line), severity=1)
+
 
+    def validate(self, smdr_line):
+        event_length = len(smdr_line)
+        if type(smdr_line) is bytes:
+            time_pattern = BYTE_TIME_PATTERNS[event_length]
+            separator = b' '
+        else:
+            time_pattern = TIME_PATTERNS[event_length]
+            separator = ' '
+        if time_pattern.match(smdr_line[self.time_start:self.time_end]) is None:
+            self.raise_validation_exception(event_length, smdr_line)
+        for position in self.separators:
+            if smdr_line[position:position + 1] != separator:
+                self.raise_validation_exception(event_length, smdr_line)
+
+
+class SMDREvent207(SMDREvent):
+    __slots__ = ()
+    time_start, time_end = 7, 15
+    separators = (6, 15, 27, 40, 85, 110)
+    length_flag = SMDRField(0, strip=False)
+    date = SMDRField(1, 6, strip=False)
+    time = SMDRField(7, 15, strip=False)
+    duration = SMDRField(17, 27, strip=False)
+    duration_seconds = SMDRDurationField(17, 27)
+    calling_party = SMDRField(28, 35)
+    time_to_answer = SMDRField(36, 40)
+    answer_seconds = SMDRAnswerSecondsField(36, 40)
+    dialed_digits = SMDRField(41, 67)
+    completion_flag = SMDRField(67)
+    speed_call_flag = SMDRField(68)
+    called_party = SMDRField(69, 76)
+    trans_conf_flag = SMDRField(84)
+    third_party = SMDRField(86, 92)
+    system_id = SMDRField(107, 110, strip=False)
+    ani = SMDRField(113, 123)
+    dnis = SMDRField(134, 144)
+    call_id = SMDRField(153, 161, strip=False)
+    sequence_id = SMDRField(162, strip=False)
+    associated_id = SMDRField(164, 172)
+
+
+class SMDREvent204(SMDREvent):
+    __slots__ = ()
+    time_start, time_end = 7, 12
+    separators = (6, 12, 24, 37, 82, 107)
+    length_flag = SMDRField(0, strip=False)
+    date = SMDRField(1, 6, strip=False)
+    time = SMDRTime204Field(7, 12)
+    duration = SMDRField(14, 24, strip=False)
+    duration_seconds = SMDRDurationField(14, 24)
+    calling_party = SMDRField(25, 32)
+    time_to_answer = SMDRField(33, 37)
+    answer_seconds = SMDRAnswerSecondsField(33, 37)
+    dialed_digits = SMDRField(38, 64)
+    completion_flag = SMDRField(64)
+    speed_call_flag = SMDRField(65)
+    called_party = SMDRField(66, 73)
+    trans_conf_flag = SMDRField(81)
+    third_party = SMDRField(83, 90)
+    system_id = SMDRField(104, 107, strip=False)
+    ani = SMDRField(110, 120)
+    dnis = SMDRField(131, 141)
+    call_id = SMDRField(150, 158, strip=False)
+    sequence_id = SMDRField(159, strip=False)
+    associated_id = SMDRField(161, 169)
+
+
+class SMDREvent113(SMDREvent):
+    __slots__ = ()
+    time_start, time_end = 7, 13
+    separators = (6, 13, 32, 66, 101)
+    length_flag = SMDRField(0, strip=False)
+    date = SMDRField(1, 6, strip=False)
+    time = SMDRTime113Field(7, 13)
+    duration = SMDRField(14, 22, strip=False)
+    duration_seconds = SMDRDurationField(14, 22)
+    calling_party = SMDRField(23, 28)
+    time_to_answer = SMDRField(29, 32)
+    answer_seconds = SMDRAnswerSecondsField(29, 32)
+    dialed_digits = SMDRField(33, 59)
+    completion_flag = SMDRField(59)
+    speed_call_flag = SMDRField(60)
+    called_party = SMDRField(61, 65)
+    trans_conf_flag = SMDRField(65)
+    third_party = SMDRField(67, 71)
+    system_id = SMDRConstantField('')
+    ani = SMDRField(91, 101)
+    dnis = SMDRField(102, 112)
+    call_id = SMDRConstantField('')
+    sequence_id = SMDRConstantField('')
+    associated_id = SMDRConstantField('')
+
+
+SMDREvent.layouts = {207: SMDREvent207,
+                     204: SMDREvent204,
+                     113: SMDREvent113}
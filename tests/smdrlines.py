@@ -0,0 +1,18 @@
+import smdrreader
+
+DEFAULT_TIMES = {207: '09:31:04', 204: '09:31', 113: '09:31A'}
+DEFAULT_DURATIONS = {207: '0000:00:19', 204: '0000:00:19', 113: '00:00:19'}
+
+
+def make_line(length, **values):
+    layout = smdrreader.SMDREvent.layouts[length]
+    values.setdefault('date', '04/01')
+    values.setdefault('time', DEFAULT_TIMES[length])
+    values.setdefault('duration', DEFAULT_DURATIONS[length])
+    line = [' '] * length
+    for name, value in values.items():
+        field = layout.__dict__[name]
+        if len(value) > field.end - field.start:
+            raise ValueError('Value too long for {}: "{}"'.format(name, value))
+        line[field.start:field.start + len(value)] = value
+    return ''.join(line)
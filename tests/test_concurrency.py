@@ -0,0 +1,100 @@
+import random
+import unittest
+import concurrency
+
+
+def get_count(segments, timestamp):
+    for start, end, count in segments:
+        if start <= timestamp < end:
+            return count
+    return 0
+
+
+class IncrementalConcurrencyCounterTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(207)
+        self.extensions = ['100{}'.format(index) for index in range(6)]
+
+
+    def get_calls(self, count):
+        calls = []
+        for index in range(count):
+            start = self.random.randrange(0, 5000)
+            calls.append((self.random.choice(self.extensions), start,
+                          start + self.random.randrange(0, 300)))
+        return calls
+
+
+    def get_positive_runs(self, segments):
+        return concurrency.merge_runs([segment for segment in segments
+                                       if segment[2] > 0])
+
+
+    def test_matches_concurrency_counter(self):
+        counter = concurrency.ConcurrencyCounter(self.extensions)
+        incremental = concurrency.IncrementalConcurrencyCounter(
+                self.extensions)
+        for extension, start, end in self.get_calls(400):
+            counter.add_call(extension, start, end)
+            incremental.add_call(extension, start, end)
+        segments = counter.get_segments()
+        self.assertEqual(self.get_positive_runs(
+                incremental.get_segments(0, 6000)),
+                self.get_positive_runs(segments))
+        for timestamp in self.random.sample(range(-10, 6000), 500):
+            self.assertEqual(incremental.count_at(timestamp),
+                             get_count(segments, timestamp))
+
+
+    def test_pieces_cover_only_new_time(self):
+        incremental = concurrency.IncrementalConcurrencyCounter(['1000'])
+        self.assertEqual(incremental.add_call('1000', 10, 20), [(10, 20)])
+        self.assertEqual(incremental.add_call('1000', 5, 30),
+                         [(5, 10), (20, 30)])
+        self.assertEqual(incremental.add_call('1000', 12, 18), [])
+        self.assertEqual(concurrency.merge_runs(
+                incremental.get_segments(0, 40)),
+                [(0, 5, 0), (5, 30, 1), (30, 40, 0)])
+
+
+    def test_expire_keeps_counts(self):
+        counter = concurrency.ConcurrencyCounter(self.extensions)
+        incremental = concurrency.IncrementalConcurrencyCounter(
+                self.extensions)
+        calls = sorted(self.get_calls(400), key=lambda call: call[1])
+        for position, (extension, start, end) in enumerate(calls):
+            counter.add_call(extension, start, end)
+            incremental.add_call(extension, start, end)
+            if position % 50 == 49:
+                incremental.expire(start - 300)
+        segments = counter.get_segments()
+        for timestamp in range(calls[-1][1] - 300, 6000, 7):
+            self.assertEqual(incremental.count_at(timestamp),
+                             get_count(segments, timestamp))
+
+
+class ParseThresholdTest(unittest.TestCase):
+    def test_valid_thresholds(self):
+        self.assertEqual(concurrency.parse_threshold('N', 8), 8)
+        self.assertEqual(concurrency.parse_threshold('n', 8), 8)
+        self.assertEqual(concurrency.parse_threshold('N-1', 8), 7)
+        self.assertEqual(concurrency.parse_threshold('N - 2', 8), 6)
+        self.assertEqual(concurrency.parse_threshold('N+1', 8), 9)
+        self.assertEqual(concurrency.parse_threshold('3/4', 8), 6)
+        self.assertEqual(concurrency.parse_threshold('3/4', 7), 6)
+        self.assertEqual(concurrency.parse_threshold('90%', 8), 8)
+        self.assertEqual(concurrency.parse_threshold('50%', 7), 4)
+        self.assertEqual(concurrency.parse_threshold('5', 8), 5)
+
+
+    def test_invalid_thresholds(self):
+        for threshold in ('3/0', '3/', '/4', '1/2/3', 'x', 'N-x', '%', ''):
+            with self.assertRaises(ValueError):
+                concurrency.parse_threshold(threshold, 8)
+
+
+class SplitArgsTest(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(list(concurrency.split_args(['1000-1002 1010',
+                                                      '1020'])),
+                         ['1000', '1001', '1002', '1010', '1020'])
@@ -0,0 +1,90 @@
+import os
+import datetime
+import tempfile
+import unittest
+import smdrreader
+import eventstore
+from smdrlines import make_line
+
+
+class EventStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.node_directory = os.path.join(self.directory.name, 'Node_01')
+        os.makedirs(self.node_directory)
+        self.days = [datetime.datetime(2016, 4, 1),
+                     datetime.datetime(2016, 4, 2)]
+        self.lines = {
+                self.days[0]: [make_line(207, time='10:00:00',
+                                         called_party='1001',
+                                         call_id='A1000001', sequence_id='1'),
+                               make_line(204, time='11:30',
+                                         called_party='1002'),
+                               make_line(207, time='23:59:50',
+                                         called_party='1014',
+                                         call_id='A1000377', sequence_id='1')],
+                self.days[1]: [make_line(207, date='04/02', time='00:00:09',
+                                         called_party='1015',
+                                         call_id='A1000900', sequence_id='2',
+                                         associated_id='A1000377')]}
+        for day, lines in self.lines.items():
+            self.write_day(day, lines)
+        self.store = eventstore.EventStore(os.path.join(self.directory.name,
+                                                        'events.db'))
+
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+
+    def write_day(self, day, lines):
+        filefullpath = os.path.join(self.node_directory, 's{}.txt'.format(
+                                    day.strftime('%Y%m%d')))
+        with open(filefullpath, 'w') as smdr_file:
+            smdr_file.write(''.join(line + '\n' for line in lines))
+
+
+    def test_round_trip(self):
+        self.assertEqual(self.store.ingest_smdr([self.node_directory],
+                                                self.days), 2)
+        for day in self.days:
+            events = self.store.get_events(self.node_directory, day)
+            self.assertEqual([str(event) for event in events],
+                             self.lines[day])
+            parsed_events = list(smdrreader.parse_events(
+                    [line.encode('ascii') for line in self.lines[day]],
+                    file_date=day.date()))
+            self.assertEqual([type(event) for event in events],
+                             [type(event) for event in parsed_events])
+            self.assertEqual([event.start_epoch for event in events],
+                             [event.start_epoch for event in parsed_events])
+        self.assertIsNone(self.store.get_events(self.node_directory,
+                                                datetime.datetime(2016, 4, 3)))
+
+
+    def test_reingest_only_changed_files(self):
+        self.store.ingest_smdr([self.node_directory], self.days)
+        self.assertEqual(self.store.ingest_smdr([self.node_directory],
+                                                self.days), 0)
+        lines = self.lines[self.days[1]] + [make_line(
+                207, date='04/02', time='08:00:00', call_id='A1000500')]
+        self.write_day(self.days[1], lines)
+        os.utime(os.path.join(self.node_directory, 's20160402.txt'),
+                 ns=(0, 0))
+        self.assertEqual(self.store.ingest_smdr([self.node_directory],
+                                                self.days), 1)
+        self.assertEqual([str(event) for event in self.store.get_events(
+                          self.node_directory, self.days[1])], lines)
+
+
+    def test_find_events_across_midnight(self):
+        self.store.ingest_smdr([self.node_directory], self.days)
+        found = self.store.find_events([self.node_directory], ['A1000900'],
+                                       self.days[1], self.days[1])
+        self.assertEqual(sorted((day, node, position, str(event))
+                                for day, node, position, event in found),
+                         [('20160401', 'Node_01', 2,
+                           self.lines[self.days[0]][2]),
+                          ('20160402', 'Node_01', 0,
+                           self.lines[self.days[1]][0])])
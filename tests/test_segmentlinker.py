@@ -0,0 +1,71 @@
+import os
+import sys
+import codecs
+import tempfile
+import unittest
+import subprocess
+from smdrlines import make_line
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_day(directory, basename, lines):
+    with open(os.path.join(directory, basename), 'wb') as smdr_file:
+        smdr_file.write(codecs.BOM_UTF8 + ''.join(
+                line + '\r\n' for line in lines).encode('ascii'))
+
+
+class CrossMidnightTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        node_directory = os.path.join(self.directory.name, 'Node_01')
+        os.makedirs(node_directory)
+        self.first_call = make_line(207, date='04/01', time='10:00:00',
+                                    called_party='1001', call_id='A1000001',
+                                    sequence_id='1')
+        self.late_call = make_line(207, date='04/01', time='23:59:50',
+                                   called_party='1014', call_id='A1000377',
+                                   sequence_id='1')
+        self.continued_call = make_line(207, date='04/02', time='00:00:09',
+                                        called_party='1015',
+                                        call_id='A1000900', sequence_id='2',
+                                        associated_id='A1000377')
+        self.second_call = make_line(207, date='04/02', time='08:00:00',
+                                     called_party='1002', call_id='A1000500',
+                                     sequence_id='1')
+        write_day(node_directory, 's20160401.txt',
+                  [self.first_call, self.late_call])
+        write_day(node_directory, 's20160402.txt',
+                  [self.continued_call, self.second_call])
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def run_linker(self, *args):
+        result = subprocess.run([sys.executable, 'segmentlinker.py'] +
+                                list(args) + ['2016-04-01', '2016-04-02',
+                                              self.directory.name],
+                                cwd=REPO_DIRECTORY, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True, check=True)
+        calls = [[line.rstrip() for line in block.splitlines()]
+                 for block in result.stdout.strip('\n').split('\n\n')]
+        return calls, result.stderr
+
+
+    def test_all_calls(self):
+        calls, errors = self.run_linker()
+        self.assertEqual(calls, [[self.first_call.rstrip()],
+                                 [self.late_call.rstrip(),
+                                  self.continued_call.rstrip()],
+                                 [self.second_call.rstrip()]])
+        self.assertIn('3 unique calls processed', errors)
+
+
+    def test_selected_call(self):
+        calls, errors = self.run_linker('-c', 'A1000900')
+        self.assertEqual(calls, [[self.late_call.rstrip(),
+                                  self.continued_call.rstrip()]])
+        self.assertIn('1 unique calls processed', errors)
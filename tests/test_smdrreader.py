@@ -0,0 +1,144 @@
+import os
+import datetime
+import tempfile
+import unittest
+import smdrreader
+from smdrlines import make_line
+
+
+class LayoutTest(unittest.TestCase):
+    def parse(self, line, file_date=datetime.date(2016, 4, 1)):
+        errors = []
+        events = list(smdrreader.parse_events(
+                [line.encode('ascii') + b'\r\n'],
+                lambda e, line: errors.append(e), file_date))
+        return events, errors
+
+
+    def test_layout_207(self):
+        events, errors = self.parse(make_line(
+                207, time='23:59:50', calling_party='T001',
+                time_to_answer='30', dialed_digits='P001 104 104',
+                called_party='1014', call_id='A1000900', sequence_id='2',
+                associated_id='A1000377'))
+        self.assertEqual(errors, [])
+        event = events[0]
+        self.assertEqual(type(event), smdrreader.SMDREvent207)
+        self.assertEqual(event.time, '23:59:50')
+        self.assertEqual(event.duration_seconds, 19)
+        self.assertEqual(event.calling_party, 'T001')
+        self.assertEqual(event.answer_seconds, 30)
+        self.assertEqual(event.dialed_digits, 'P001 104 104')
+        self.assertEqual(event.called_party, '1014')
+        self.assertEqual(event.call_id, 'A1000900')
+        self.assertEqual(event.sequence_id, '2')
+        self.assertEqual(event.associated_id, 'A1000377')
+
+
+    def test_layout_204(self):
+        events, errors = self.parse(make_line(
+                204, time='13:05', calling_party='1001', called_party='1002',
+                call_id='A1000001'))
+        self.assertEqual(errors, [])
+        event = events[0]
+        self.assertEqual(type(event), smdrreader.SMDREvent204)
+        self.assertEqual(event.time, '13:05:00')
+        self.assertEqual(event.calling_party, '1001')
+        self.assertEqual(event.called_party, '1002')
+        self.assertEqual(event.call_id, 'A1000001')
+        self.assertIsNone(event.answer_seconds)
+
+
+    def test_layout_113(self):
+        events, errors = self.parse(make_line(
+                113, time='12:15A', calling_party='1001', called_party='1002'))
+        self.assertEqual(errors, [])
+        event = events[0]
+        self.assertEqual(type(event), smdrreader.SMDREvent113)
+        self.assertEqual(event.time, '00:15:00')
+        self.assertEqual(event.calling_party, '1001')
+        self.assertEqual(event.called_party, '1002')
+        self.assertEqual(event.call_id, '')
+        events, errors = self.parse(make_line(113, time='01:15P'))
+        self.assertEqual(events[0].time, '13:15:00')
+
+
+    def test_start_epoch_uses_previous_year(self):
+        events, errors = self.parse(make_line(207, date='12/31'),
+                                    datetime.date(2017, 1, 1))
+        self.assertEqual(time_tuple(events[0].start_epoch)[:3],
+                         (2016, 12, 31))
+
+
+    def test_invalid_lines(self):
+        line = make_line(207)
+        events, errors = self.parse(line[:7] + '99' + line[9:])
+        self.assertEqual(events, [])
+        self.assertEqual(len(errors), 1)
+        events, errors = self.parse(line + ' ')
+        self.assertEqual(events, [])
+        self.assertEqual(str(errors[0]), 'Unknown SMDR event encountered')
+
+
+def time_tuple(epoch):
+    return datetime.datetime.fromtimestamp(epoch).timetuple()
+
+
+class SMDRCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = smdrreader.SMDRCache(os.path.join(self.directory.name,
+                                                       'cache'))
+        self.filefullpath = os.path.join(self.directory.name, 's20160401.txt')
+        lines = [make_line(207, call_id='A100000{}'.format(index))
+                 for index in range(5)]
+        lines.append(make_line(204, called_party='1003'))
+        lines.append(make_line(113, called_party='1004'))
+        lines.append('not an event')
+        lines.append(make_line(207, dialed_digits='P001 104 104 é'))
+        with open(self.filefullpath, 'wb') as smdr_file:
+            smdr_file.write(''.join(line + '\r\n' for line in lines)
+                            .encode('UTF-8'))
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_round_trip(self):
+        file_date = datetime.date(2016, 4, 1)
+        events, errors = smdrreader.parse_file(self.filefullpath, self.cache,
+                                               file_date)
+        cached_events, cached_errors = self.cache.load(self.filefullpath,
+                                                       file_date)
+        self.assertEqual([str(event) for event in cached_events],
+                         [str(event) for event in events])
+        self.assertEqual([type(event) for event in cached_events],
+                         [type(event) for event in events])
+        self.assertEqual([event.file_date for event in cached_events],
+                         [file_date] * len(events))
+        self.assertEqual([(str(e), e.severity, line)
+                          for e, line in cached_errors],
+                         [(str(e), e.severity, line) for e, line in errors])
+
+
+    def test_corrupt_file_is_a_miss(self):
+        smdrreader.parse_file(self.filefullpath, self.cache)
+        cache_path = self.cache.get_cache_path(self.filefullpath)
+        with open(cache_path, 'rb') as cache_file:
+            data = cache_file.read()
+        magic_length = len(self.cache.magic)
+        for corrupt_data in (data[:magic_length + 2],
+                             data[:magic_length] + b'\xff\xff\x00\x00',
+                             data[:magic_length + 4] + b'\x00' * 16,
+                             data[:-8]):
+            with open(cache_path, 'wb') as cache_file:
+                cache_file.write(corrupt_data)
+            self.assertIsNone(self.cache.load(self.filefullpath))
+
+
+    def test_changed_source_is_a_miss(self):
+        smdrreader.parse_file(self.filefullpath, self.cache)
+        with open(self.filefullpath, 'ab') as smdr_file:
+            smdr_file.write(make_line(207).encode('ascii') + b'\r\n')
+        self.assertIsNone(self.cache.load(self.filefullpath))